@@ -1,30 +1,94 @@
-from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, send_from_directory, send_file
-import docker
-import subprocess
-import shlex
+from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, send_from_directory, Response, stream_with_context
+from flask.sessions import SecureCookieSessionInterface
+import sys
 import os
-from datetime import datetime
-from github import Github, UnknownObjectException, GithubException
+from datetime import datetime, timezone
 import secrets
 import logging
 import urllib.parse 
-import io
-import zipfile # For creating ZIP files
-import shutil # For removing directories
+from werkzeug.utils import safe_join
+import autocompose # In-process compose generation (no subprocess per job)
+from inventory import ContainerSnapshot, MetadataCache
+import json
+import time
+import hashlib
+import queue
+import threading
+from docker_pool import DockerConnection
+import metrics
+from hosts import DockerHost, HostRegistry, parse_docker_hosts
+from artifacts import ArtifactStore, save_batch_atomically
+from scheduler import SnapshotScheduler, changed_files
+from jobs import JobManager
+from history import HistoryStore
+from container_query import query_rows, decode_cursor, row_matches, project_index, SORT_FIELDS
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 app = Flask(__name__)
-app.secret_key = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(16))
+app.secret_key = os.getenv('FLASK_SECRET_KEY') # Unset: generated once and kept in JOB_STATE_DIR (see load_secret_key)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = app.logger
+# autocompose logs per-container detail at DEBUG; keep it out of the app logs unless asked for
+try: logging.getLogger('autocompose').setLevel(os.getenv('AUTOCOMPOSE_LOG_LEVEL', 'WARNING').upper())
+except ValueError:
+    logging.getLogger('autocompose').setLevel(logging.WARNING)
+    logger.warning(f"Invalid AUTOCOMPOSE_LOG_LEVEL {os.getenv('AUTOCOMPOSE_LOG_LEVEL')!r}; using WARNING.")
 
 # --- Configuration ---
-AUTOCOMPOSE_SCRIPT_PATH = "./autocompose.py" 
 GENERATED_FILES_BASE_OUTPUT_DIR = os.path.abspath(os.getenv('OUTPUT_DIR', "/generated_compose_files")) 
 TEMP_COMPOSE_DIR = os.path.abspath("./compose_temp") 
 logger.info(f"GENERATED_FILES_BASE_OUTPUT_DIR set to: {GENERATED_FILES_BASE_OUTPUT_DIR}")
 logger.info(f"TEMP_COMPOSE_DIR set to: {TEMP_COMPOSE_DIR}")
+ARTIFACT_STORE = ArtifactStore(TEMP_COMPOSE_DIR) # Generated files live on disk; the session only holds the batch ID
+metrics.TEMP_DIR_BYTES.set_function(ARTIFACT_STORE.total_size) # Measured at scrape time
+JOB_STATE_DIR = os.path.abspath(os.getenv('JOB_STATE_DIR', "./job_state"))
+SECRET_KEY_PATH = os.path.join(JOB_STATE_DIR, "flask_secret_key")
+_secret_key_lock = threading.Lock()
+
+def load_secret_key(path):
+    """
+    The session signing key stored at path, created on first use. Every worker and restart reads
+    the same key, so session cookies (and the job history keyed by them) stay valid. Falls back to
+    a key for this process only if the file can't be read or written.
+    """
+    for _ in range(2):
+        try:
+            with open(path, encoding="utf-8") as f: key = f.read().strip()
+            if key: return key
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not read {path}: {e}")
+            break
+        key = secrets.token_hex(32)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f: f.write(key)
+            os.link(tmp_path, path) # Atomic, and fails if another worker got there first; then read theirs
+            return key
+        except FileExistsError:
+            continue
+        except OSError as e:
+            logger.warning(f"Could not save the session key to {path}: {e}")
+            break
+        finally:
+            try: os.unlink(tmp_path)
+            except OSError: pass
+    logger.warning("Using a session key for this process only; set FLASK_SECRET_KEY so sessions and job history survive restarts.")
+    return secrets.token_hex(32)
+
+class PersistentKeySessionInterface(SecureCookieSessionInterface):
+    """Loads the stored secret key on the first request that needs a session, so importing app.py does no file I/O."""
+    def get_signing_serializer(self, app):
+        if not app.secret_key:
+            with _secret_key_lock:
+                if not app.secret_key: app.secret_key = load_secret_key(SECRET_KEY_PATH)
+        return super().get_signing_serializer(app)
+
+app.session_interface = PersistentKeySessionInterface()
 
 # GitHub Configuration from Environment Variables
 GITHUB_TOKEN_FROM_ENV = os.getenv('GITHUB_TOKEN') 
@@ -33,65 +97,128 @@ GITHUB_UPLOAD_PATH_ENV = os.getenv('GITHUB_UPLOAD_PATH', "")
 GITHUB_UPLOAD_BRANCH_ENV = os.getenv('GITHUB_UPLOAD_BRANCH', "main") 
 USER_SET_GITHUB_COMMIT_MSG = os.getenv('GITHUB_UPLOAD_COMMIT_MSG') 
 ENABLE_GITHUB_UPLOAD = os.getenv('ENABLE_GITHUB_UPLOAD', 'false').lower() == 'true'
+GITHUB_API_URL_ENV = os.getenv('GITHUB_API_URL', "https://api.github.com") # Point at GitHub Enterprise or a local fake API
+GITHUB_BATCH_COMMIT = os.getenv('GITHUB_BATCH_COMMIT', 'true').lower() == 'true' # One commit per batch instead of one per file
+
+# Max number of compose files generated concurrently by "Generate Individuals"
+try: GENERATION_WORKERS = max(1, int(os.getenv('GENERATION_WORKERS', '4')))
+except ValueError: GENERATION_WORKERS = 4
 
 logger.info(f"GitHub Upload Feature Enabled by ENV: {ENABLE_GITHUB_UPLOAD}")
 logger.info(f"GitHub Token Provided via ENV: {bool(GITHUB_TOKEN_FROM_ENV)}")
 logger.info(f"GitHub Target Repo via ENV: {GITHUB_TARGET_REPO_ENV}")
+logger.info(f"Generation worker limit: {GENERATION_WORKERS}")
 
-# --- Helper Function to clear and recreate TEMP_COMPOSE_DIR ---
-def clear_and_recreate_temp_dir():
-    if os.path.exists(TEMP_COMPOSE_DIR):
-        try:
-            shutil.rmtree(TEMP_COMPOSE_DIR)
-            logger.info(f"Successfully removed temporary directory: {TEMP_COMPOSE_DIR}")
-        except Exception as e:
-            logger.error(f"Error removing temporary directory {TEMP_COMPOSE_DIR}: {e}")
-    try:
-        os.makedirs(TEMP_COMPOSE_DIR, exist_ok=True)
-        logger.info(f"Ensured temporary compose directory exists: {TEMP_COMPOSE_DIR}")
-    except OSError as e:
-        logger.error(f"Could not create temporary compose directory {TEMP_COMPOSE_DIR}: {e}")
+# Background jobs (generate / save / upload) started from the UI
+try: JOB_WORKERS = max(1, int(os.getenv('JOB_WORKERS', '2')))
+except ValueError: JOB_WORKERS = 2
+JOBS = JobManager(JOB_STATE_DIR, max_workers=JOB_WORKERS)
+GENERATE_ACTIONS = ("generate_stack", "generate_individuals")
+BATCH_JOB_ACTIONS = ("save_all_local", "upload_all_github")
+
+# Job history lives in a local SQLite file rather than the session cookie, kept per browser session
+HISTORY_DB_PATH = os.path.abspath(os.getenv('HISTORY_DB_PATH', os.path.join(JOB_STATE_DIR, "history.sqlite3")))
+try:
+    HISTORY_MAX_ENTRIES = max(1, int(os.getenv('HISTORY_MAX_ENTRIES', '1000')))
+    HISTORY_MAX_AGE_DAYS = max(0.0, float(os.getenv('HISTORY_MAX_AGE_DAYS', '90')))
+except ValueError:
+    HISTORY_MAX_ENTRIES, HISTORY_MAX_AGE_DAYS = 1000, 90.0
+HISTORY = HistoryStore(HISTORY_DB_PATH, max_entries=HISTORY_MAX_ENTRIES, max_age_seconds=HISTORY_MAX_AGE_DAYS * 86400 or None)
+HISTORY_PAGE_DEFAULT_LIMIT = 50
+HISTORY_PAGE_MAX_LIMIT = 500
+
+# Image/network metadata cache shared by all requests in this worker (invalidated by Docker events)
+try:
+    METADATA_CACHE_SIZE = max(1, int(os.getenv('METADATA_CACHE_SIZE', '1024')))
+    METADATA_CACHE_TTL = max(0, int(os.getenv('METADATA_CACHE_TTL', '300')))
+except ValueError:
+    METADATA_CACHE_SIZE, METADATA_CACHE_TTL = 1024, 300
+# Rendered service fragments keyed by container fingerprint, so unchanged services are not regenerated
+try: FRAGMENT_CACHE_SIZE = max(1, int(os.getenv('FRAGMENT_CACHE_SIZE', '4096')))
+except ValueError: FRAGMENT_CACHE_SIZE = 4096
+# One pooled, health-checked Docker client per daemon and worker process
+try:
+    DOCKER_POOL_SIZE = max(1, int(os.getenv('DOCKER_POOL_SIZE', '10')))
+    DOCKER_HEALTH_INTERVAL = max(1, int(os.getenv('DOCKER_HEALTH_INTERVAL', '30')))
+except ValueError:
+    DOCKER_POOL_SIZE, DOCKER_HEALTH_INTERVAL = 10, 30
+# Docker daemons to manage: "name=url,name2=url2" (unix/tcp/ssh); empty means the local daemon only
+DOCKER_HOST_SPECS = parse_docker_hosts(os.getenv('DOCKER_HOSTS', ''))
+try: DOCKER_HOST_TIMEOUT = max(1.0, float(os.getenv('DOCKER_HOST_TIMEOUT', '10')))
+except ValueError: DOCKER_HOST_TIMEOUT = 10.0
+
+# Live container inventory fed by the Docker events stream (set ENABLE_LIVE_INVENTORY=false to list on every request)
+ENABLE_LIVE_INVENTORY = os.getenv('ENABLE_LIVE_INVENTORY', 'true').lower() == 'true'
+INVENTORY_READY_TIMEOUT = 5 # Seconds a request waits for the first inventory sync before listing directly
+INVENTORY_STREAM_MAX_SECONDS = 300 # SSE connections are recycled so they don't pin worker threads forever
+# Each open stream holds a worker thread; past this many per process, browsers are told to poll instead
+try: INVENTORY_STREAM_MAX_CONNECTIONS = max(0, int(os.getenv('INVENTORY_STREAM_MAX_CONNECTIONS', '4')))
+except ValueError: INVENTORY_STREAM_MAX_CONNECTIONS = 4
+INVENTORY_STREAM_RETRY_SECONDS = 30
+INVENTORY_STREAM_SLOTS = threading.BoundedSemaphore(INVENTORY_STREAM_MAX_CONNECTIONS) if INVENTORY_STREAM_MAX_CONNECTIONS else None
+
+# Per-batch temp workspaces are expired in the background by age and total size
+try:
+    TEMP_MAX_AGE_HOURS = float(os.getenv('TEMP_MAX_AGE_HOURS', '24'))
+    TEMP_QUOTA_MB = float(os.getenv('TEMP_QUOTA_MB', '512'))
+except ValueError:
+    TEMP_MAX_AGE_HOURS, TEMP_QUOTA_MB = 24, 512
+TEMP_REAP_INTERVAL_SECONDS = 300
+
+# Headless whole-host snapshots on an interval (0 = off); only changed files are written/uploaded
+try: SNAPSHOT_INTERVAL_MINUTES = float(os.getenv('SNAPSHOT_INTERVAL_MINUTES', '0'))
+except ValueError: SNAPSHOT_INTERVAL_MINUTES = 0
+SNAPSHOT_SUBDIR = os.getenv('SNAPSHOT_SUBDIR', "host_snapshot").strip("/\\") or "host_snapshot"
+SNAPSHOT_UPLOAD_GITHUB = os.getenv('SNAPSHOT_UPLOAD_GITHUB', 'true').lower() == 'true'
 
-# --- Initial Cleanup on Application Start ---
-clear_and_recreate_temp_dir()
+# --- One-time Setup per Worker Process ---
+_startup_lock = threading.Lock()
+_started = False
+
+def startup():
+    """
+    Creates the temp directory and starts the reaper and snapshot threads, once per process.
+    Called from gunicorn's post_worker_init hook (gunicorn.conf.py), before app.run() and on
+    the first request, so importing app.py has no filesystem or thread side effects.
+    """
+    global _started
+    if _started: return
+    with _startup_lock:
+        if _started: return
+        try:
+            ARTIFACT_STORE.ensure_root()
+            logger.info(f"Ensured temporary compose directory exists: {TEMP_COMPOSE_DIR}")
+        except OSError as e:
+            logger.error(f"Could not create temporary compose directory {TEMP_COMPOSE_DIR}: {e}")
+        ARTIFACT_STORE.start_reaper(TEMP_REAP_INTERVAL_SECONDS, max_age_seconds=TEMP_MAX_AGE_HOURS * 3600, max_total_bytes=int(TEMP_QUOTA_MB * 1024 * 1024))
+        if SNAPSHOT_INTERVAL_MINUTES > 0: SNAPSHOT_SCHEDULER.start()
+        _started = True
 
 
 # --- Helper Functions ---
 def get_docker_client():
-    try:
-        client = docker.from_env()
-        client.ping() 
-        logger.info("Successfully connected to Docker daemon.")
-        return client
-    except docker.errors.DockerException as e:
-        logger.error(f"Could not connect to Docker daemon: {e}")
-        return None
-
-def run_autocompose_script(container_ids): 
-    if not os.path.exists(AUTOCOMPOSE_SCRIPT_PATH):
-        logger.error(f"CRITICAL ERROR: autocompose.py not found at {AUTOCOMPOSE_SCRIPT_PATH}.")
-        return None, f"autocompose.py not found at {AUTOCOMPOSE_SCRIPT_PATH}", -2
+    return DEFAULT_HOST.get_client()
+
+def run_autocompose_script(container_ids, client=None, snapshot=None, changes=None, fragment_cache=None, stream=None): 
+    """Returns (yaml_text, error, rc); with a stream, the YAML is written to it service by service and yaml_text is ""."""
     if not container_ids: 
         logger.warning("run_autocompose_script called with no container IDs.")
         return "", "No container IDs provided.", -1
+    if snapshot is not None:
+        client = snapshot.client
+    elif client is None:
+        client = get_docker_client()
+        if client is None:
+            return None, "Could not connect to Docker.", -2
     
-    command = ["python3", AUTOCOMPOSE_SCRIPT_PATH]
-    command.extend(container_ids)
-    display_command = ' '.join(shlex.quote(c) for c in command)
-    logger.info(f"Executing: {display_command}")
+    logger.info(f"Generating compose in-process for: {', '.join(container_ids)}")
     try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8')
-        stdout, stderr = process.communicate(timeout=90)
-        if stderr: 
-            logger.info(f"autocompose.py stderr:\n{stderr.strip()}")
-        if process.returncode != 0:
-            logger.error(f"autocompose.py script error (code {process.returncode}).")
-        return stdout, stderr, process.returncode
-    except subprocess.TimeoutExpired:
-        logger.error("autocompose.py script execution timed out.")
-        return None, "Script execution timed out.", -1
+        with metrics.GENERATION_SECONDS.time(), metrics.phase('render'):
+            yaml_text, service_changes = autocompose.render_compose(client, container_ids, False, False, snapshot=snapshot, fragment_cache=fragment_cache if fragment_cache is not None else FRAGMENT_CACHE, stream=stream)
+        if changes is not None: changes.extend(service_changes)
+        return yaml_text or "", "", 0
     except Exception as e:
-        logger.error(f"Exception running autocompose.py: {str(e)}")
+        logger.error(f"Exception generating compose: {str(e)}")
         return None, f"Error running autocompose: {str(e)}", -3
 
 def sanitize_filename_base(name):
@@ -103,20 +230,24 @@ def sanitize_filename_base(name):
 def generate_timestamped_dirname(): 
     return f"Autocompose-GUI_{datetime.now().strftime('%m-%d-%Y_%H-%M-%S')}"
 
+def _github_remote_dir(base_remote_path, output_subdir_name):
+    full_remote_path_dir = os.path.join(base_remote_path.strip("/"), output_subdir_name).replace("\\", "/")
+    return full_remote_path_dir[1:] if full_remote_path_dir.startswith("/") else full_remote_path_dir
+
+@metrics.timed('github_api')
 def _upload_to_github_internal(token, repo_name_str, base_remote_path, output_subdir_name, file_content_str, simple_filename, commit_message_template, branch_name):
     if not token: return "GitHub Token not available (GITHUB_TOKEN environment variable not set).", "danger"
     if not repo_name_str: return "GitHub Target Repository not configured (GITHUB_TARGET_REPO environment variable not set).", "danger"
+    from github import Github, UnknownObjectException, GithubException # PyGithub is slow to import; only upload paths need it
     
     try:
-        g = Github(token)
+        g = Github(token, base_url=GITHUB_API_URL_ENV)
         repo = g.get_repo(repo_name_str)
     except GithubException as e:
         logger.error(f"GitHub Error accessing '{repo_name_str}': {e.status} {e.data}")
         return f"GitHub Error: Could not access repository '{repo_name_str}'. Check token and repo. Details: {e.status}", "danger"
     
-    clean_base_remote_path = base_remote_path.strip("/")
-    full_remote_path_dir = os.path.join(clean_base_remote_path, output_subdir_name).replace("\\", "/")
-    if full_remote_path_dir.startswith("/"): full_remote_path_dir = full_remote_path_dir[1:]
+    full_remote_path_dir = _github_remote_dir(base_remote_path, output_subdir_name)
     
     full_remote_path_file = os.path.join(full_remote_path_dir, simple_filename).replace("\\","/")
 
@@ -142,14 +273,88 @@ def _upload_to_github_internal(token, repo_name_str, base_remote_path, output_su
         logger.error(f"Unexpected error during GitHub upload for '{simple_filename}' to '{full_remote_path_file}': {str(e)}")
         return f"An unexpected error occurred during GitHub upload for '{simple_filename}': {str(e)}", "danger"
 
-def save_to_temp_and_get_info(content, output_subdir_name, simple_filename):
-    full_temp_dir = os.path.join(TEMP_COMPOSE_DIR, output_subdir_name)
-    temp_save_path = os.path.join(full_temp_dir, simple_filename)
+@metrics.timed('github_api')
+def _upload_batch_to_github_internal(token, repo_name_str, base_remote_path, files, commit_message_template, branch_name):
+    """
+    Commits all files of a batch in one commit through the Git Data API: read the branch ref
+    and its commit, create one tree (file contents inline), one commit, and move the ref.
+    If the new tree is identical to the branch head's, no commit is made and the ref is left alone.
+    files is a list of (output_subdir_name, simple_filename, file_content_str).
+    Returns one (message, category) per file, in order.
+    """
+    def all_files(msg, category): return [(msg, category)] * len(files)
+    if not token: return all_files("GitHub Token not available (GITHUB_TOKEN environment variable not set).", "danger")
+    if not repo_name_str: return all_files("GitHub Target Repository not configured (GITHUB_TARGET_REPO environment variable not set).", "danger")
+    if not files: return []
+    from github import Github, UnknownObjectException, GithubException, InputGitTreeElement # PyGithub is slow to import; only upload paths need it
+
+    try:
+        g = Github(token, base_url=GITHUB_API_URL_ENV)
+        repo = g.get_repo(repo_name_str)
+    except GithubException as e:
+        logger.error(f"GitHub Error accessing '{repo_name_str}': {e.status} {e.data}")
+        return all_files(f"GitHub Error: Could not access repository '{repo_name_str}'. Check token and repo. Details: {e.status}", "danger")
+
+    subdirs = sorted({subdir for subdir, _, _ in files})
+    commit_msg_to_use = commit_message_template
+    if not commit_msg_to_use:
+        commit_msg_to_use = f"Autocompose GUI: Add/Update {len(files)} file(s) in {', '.join(subdirs)} ({datetime.now().strftime('%Y-%m-%d_%H-%M-%S')})"
+    tree_elements = [InputGitTreeElement(f"{_github_remote_dir(base_remote_path, subdir)}/{filename}".lstrip("/"), '100644', 'blob', content=content)
+                     for subdir, filename, content in files]
+
+    logger.info(f"Attempting to commit {len(files)} file(s) to {repo_name_str} on branch {branch_name} in a single commit")
+    try:
+        for attempt in range(2): # Retry once if the branch moved while we were building the commit
+            ref = repo.get_git_ref(f"heads/{branch_name}")
+            parent_commit = repo.get_git_commit(ref.object.sha)
+            tree = repo.create_git_tree(tree_elements, base_tree=parent_commit.tree)
+            if tree.sha == parent_commit.tree.sha: # Every file already matches the branch head; an empty commit would only add noise
+                commit = None
+                break
+            commit = repo.create_git_commit(commit_msg_to_use, tree, [parent_commit])
+            try:
+                ref.edit(commit.sha)
+                break
+            except GithubException as e:
+                if e.status != 422 or attempt == 1: raise
+                logger.warning(f"Branch '{branch_name}' moved during batch upload, retrying: {e.data}")
+    except UnknownObjectException:
+        return all_files(f"GitHub Error: Branch '{branch_name}' was not found in '{repo_name_str}'.", "danger")
+    except GithubException as e:
+        logger.error(f"GitHub Error committing batch to '{repo_name_str}': {e.status} {e.data}")
+        return all_files(f"GitHub Error: Failed to commit batch. Details: {e.status}", "danger")
+    except Exception as e:
+        logger.error(f"Unexpected error during GitHub batch upload to '{repo_name_str}': {str(e)}")
+        return all_files(f"An unexpected error occurred during GitHub upload: {str(e)}", "danger")
+
+    if commit is None:
+        logger.info(f"Batch for {repo_name_str} matches branch {branch_name} at {parent_commit.sha[:7]}; nothing to commit")
+        return [(f"'{filename}' is already up to date at GitHub path '{_github_remote_dir(base_remote_path, subdir)}' (branch: {branch_name}, commit {parent_commit.sha[:7]}); nothing to commit.", "success")
+                for subdir, filename, _ in files]
+    short_sha = commit.sha[:7]
+    return [(f"Successfully committed '{filename}' to GitHub path '{_github_remote_dir(base_remote_path, subdir)}' (branch: {branch_name}, commit {short_sha}).", "success")
+            for subdir, filename, _ in files]
+
+def save_to_temp_and_get_info(content, output_subdir_name, simple_filename, batch_id):
+    """content is the file's text, or a function that writes it to the open file."""
+    temp_save_path = ARTIFACT_STORE.file_path(batch_id, output_subdir_name, simple_filename)
+    full_temp_dir = os.path.dirname(temp_save_path)
     
     logger.info(f"Attempting to save temporarily to: {temp_save_path}")
     try:
+        # temp_save times the file work only; a streamed render is already timed as render/yaml_dump
+        started, render_seconds = time.perf_counter(), 0.0
         os.makedirs(full_temp_dir, exist_ok=True)
-        with open(temp_save_path, "w", encoding="utf-8") as f: f.write(content)
+        f = open(temp_save_path, "w", encoding="utf-8")
+        try:
+            if callable(content):
+                render_started = time.perf_counter()
+                try: content(f)
+                finally: render_seconds = time.perf_counter() - render_started
+            else: f.write(content)
+        finally:
+            f.close()
+            metrics.PHASE_SECONDS.observe(time.perf_counter() - started - render_seconds, phase='temp_save')
         logger.info(f"Successfully saved temporary file to {temp_save_path}")
         return temp_save_path, f"Generated: {output_subdir_name}/{simple_filename}", "info"
     except IOError as e:
@@ -159,15 +364,237 @@ def save_to_temp_and_get_info(content, output_subdir_name, simple_filename):
         logger.error(f"Unexpected error saving temporary file to {temp_save_path}: {e_general}")
         return None, f"🔥 Unexpected error saving temporary file: {e_general}", "error"
 
-def get_container_image_name(container_attrs, client):
+def generate_temp_file(ids, base_name, subdir, snapshot, batch_id, fragment_cache=None):
+    """
+    Generates one compose file and saves it to the temp dir. Safe to run in a worker thread:
+    it never touches the request context, it only returns what happened.
+    """
+    result = {'base_name': base_name, 'file_info': None, 'history': [], 'error': None}
+    changes = []
+    sanitized_base = sanitize_filename_base(base_name)
+    simple_filename = f"{sanitized_base}.yml" 
+    generation = [] # The YAML is streamed straight into the temp file instead of being built as one string
+    temp_path, ls_msg, ls_cat = save_to_temp_and_get_info(
+        lambda f: generation.append(run_autocompose_script(ids, snapshot=snapshot, changes=changes, fragment_cache=fragment_cache, stream=f)),
+        subdir, simple_filename, batch_id)
+    _, stderr, rc = generation[0] if generation else (None, ls_msg, -4)
+    if rc != 0 and temp_path:
+        try: os.remove(temp_path)
+        except OSError: pass
+    if rc == 0:
+        changed = [name for name, status in changes if status != 'unchanged']
+        unchanged = [name for name, status in changes if status == 'unchanged']
+        
+        if temp_path: ls_msg = f"{ls_msg} Changed services: {', '.join(changed) or 'none'}; unchanged: {len(unchanged)}."
+        result['history'].append({'filename': f"{subdir}/{simple_filename}", 'operation': 'Temp Save', 'message': ls_msg, 'category': ls_cat, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+        
+        if temp_path: 
+            result['file_info'] = {
+                "filename": simple_filename, 
+                "subdir_name": subdir, 
+                "temp_path": temp_path,
+                "changed": changed,
+                "unchanged": unchanged
+            }
+    else: 
+        result['error'] = stderr or 'Unknown error'
+        result['history'].append({'filename': base_name, 'operation': 'Generation', 'message': f"Error generating compose: {result['error']}", 'category': 'danger', 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+    return result
+
+def generate_temp_files_concurrently(jobs, subdir, batch_id, max_workers=None, on_result=None):
+    """
+    Runs generate_temp_file for each (ids, base_name, snapshot, fragment_cache) job on a
+    bounded thread pool, so jobs for different Docker hosts run side by side.
+    Results come back in the same order as jobs, regardless of completion order;
+    on_result, if given, is called as each one finishes.
+    """
+    if not jobs: return []
+    workers = min(max_workers or GENERATION_WORKERS, len(jobs))
+    if workers == 1:
+        results = []
+        for ids, base_name, snapshot, fragment_cache in jobs:
+            results.append(generate_temp_file(ids, base_name, subdir, snapshot, batch_id, fragment_cache))
+            if on_result: on_result(results[-1])
+        return results
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="autocompose-gen") as executor:
+        futures = [executor.submit(generate_temp_file, ids, base_name, subdir, snapshot, batch_id, fragment_cache) for ids, base_name, snapshot, fragment_cache in jobs]
+        if on_result:
+            for future in as_completed(futures): on_result(future.result())
+        return [future.result() for future in futures]
+
+def group_by_host(selected_containers):
+    """Splits a selection (container key -> display name) into {host name: [(container ID, display name)]}, plus unknown keys."""
+    groups, unknown = {}, []
+    for key, name in selected_containers.items():
+        host, container_id = HOSTS.locate(key)
+        if host is None: unknown.append(key)
+        else: groups.setdefault(host.name, []).append((container_id, name))
+    return groups, unknown
+
+def generation_job_count(action, selected_containers, projects=None):
+    if action == "generate_projects": return sum(len(host_projects) for host_projects in (projects or {}).values())
+    return len(group_by_host(selected_containers)[0]) if action == "generate_stack" else len(selected_containers)
+
+def select_projects(projects, project=None):
+    """Narrows {host name: {compose project: [row]}} to one project (all projects when project is empty)."""
+    if not project: return {host_name: host_projects for host_name, host_projects in projects.items() if host_projects}
+    return {host_name: {project: host_projects[project]} for host_name, host_projects in projects.items() if project in host_projects}
+
+def host_snapshots(host_names, timeout=-1):
+    """{host name: ContainerSnapshot} for the given hosts, queried concurrently, and {host name: error} for the ones that failed."""
+    results = HOSTS.fan_out(lambda host: host.snapshot(host.require_client(), INVENTORY_READY_TIMEOUT),
+                            hosts=[HOSTS.get(name) for name in host_names], timeout=timeout)
+    return ({name: snapshot for name, (snapshot, error) in results.items() if error is None},
+            {name: error for name, (snapshot, error) in results.items() if error is not None})
+
+def generate_batch(action, selected_containers, snapshots, on_result=None, output_subdir_name=None, projects=None):
+    """
+    Generates a new batch for "generate_stack", "generate_individuals" or "generate_projects".
+    selected_containers maps container key ("<host>/<id>" with several Docker hosts, else the
+    ID) -> display name; snapshots maps host name -> ContainerSnapshot. With several hosts,
+    file names are prefixed with the host name and a stack is generated per host.
+    "generate_projects" ignores the selection and writes one stack per compose project in
+    projects ({host name: {compose project: [row]}}), named after the project.
+    Returns the batch ID, the job history entries and the (message, category) flashes.
+    """
+    output_subdir_name = output_subdir_name or generate_timestamped_dirname()
+    batch_id = ARTIFACT_STORE.create_batch(output_subdir_name)
+    if action == "generate_projects":
+        groups = {host_name: [row for rows in host_projects.values() for row in rows] for host_name, host_projects in (projects or {}).items()}
+        unknown = []
+    else:
+        groups, unknown = group_by_host(selected_containers)
+    flashes = [(f"Unknown Docker host for selected container '{key}'.", "danger") for key in unknown]
+    jobs = []
+    for host_name, members in groups.items():
+        snapshot = snapshots.get(host_name)
+        if snapshot is None:
+            flashes.append((f"Docker host '{host_name}' is unavailable; skipped {len(members)} container(s).", "danger"))
+            continue
+        prefix = f"{host_name}_" if HOSTS.namespaced else ""
+        fragment_cache = HOSTS.get(host_name).fragment_cache
+        if action == "generate_projects":
+            jobs.extend(([HOSTS.locate(row['id'])[1] for row in rows], prefix + project, snapshot, fragment_cache) for project, rows in projects[host_name].items())
+        elif action == "generate_stack":
+            base_name_for_combined = members[0][1] if len(members) == 1 else "docker_stack"
+            jobs.append(([c_id for c_id, _ in members], prefix + base_name_for_combined, snapshot, fragment_cache))
+        else:
+            jobs.extend(([c_id], prefix + c_name, snapshot, fragment_cache) for c_id, c_name in members)
+    results = generate_temp_files_concurrently(jobs, output_subdir_name, batch_id, on_result=on_result)
+
+    generated_files = [r['file_info'] for r in results if r['file_info']]
+    ARTIFACT_STORE.write_manifest(batch_id, output_subdir_name, [f['filename'] for f in generated_files],
+                                  {f['filename']: {'changed': f['changed'], 'unchanged': f['unchanged']} for f in generated_files})
+    flashes.extend((f"Error generating compose for '{r['base_name']}': {r['error']}", "danger") for r in results if r['error'])
+    if generated_files:
+        # Counted per file: services on different hosts may share a name, and file names carry the host prefix
+        changed_count = sum(len(f['changed']) for f in generated_files)
+        unchanged_count = sum(len(f['unchanged']) for f in generated_files)
+        flashes.append((f"{changed_count} service(s) changed since the last export, {unchanged_count} unchanged.", "info"))
+    expected_count = generation_job_count(action, selected_containers, projects)
+    if action == "generate_individuals" and results:
+        flashes.append((f"Generated {len(generated_files)} of {len(selected_containers)} files.", "info")) # Simplified message
+    elif action == "generate_projects" and results:
+        flashes.append((f"Generated {len(generated_files)} of {expected_count} compose project files.", "info"))
+    return {
+        'batch_id': batch_id,
+        'history': [entry for r in results for entry in r['history']],
+        'flashes': flashes,
+        'message': flashes[-1][0] if flashes else f"Generated {len(generated_files)} file(s).",
+        'category': 'warning' if len(generated_files) < expected_count else 'success',
+    }
+
+def save_batch_to_volume(batch_files, on_file=None):
+    history = []
+    saved_count = 0
+    by_subdir = {}
+    for file_info in batch_files:
+        by_subdir.setdefault(file_info['subdir_name'], []).append(file_info)
+    for subdir_name, file_infos in by_subdir.items():
+        try:
+            results = save_batch_atomically(file_infos, GENERATED_FILES_BASE_OUTPUT_DIR, subdir_name)
+        except Exception as e:
+            results = [(file_info, e) for file_info in file_infos]
+        for file_info, error in results:
+            if error is None:
+                ls_msg = f"✅ Saved to local volume: `{file_info['subdir_name']}/{file_info['filename']}`."
+                ls_cat = "success"
+                saved_count +=1
+            else:
+                ls_msg = f"🔥 Error saving {file_info['filename']} to local volume: {error}"
+                ls_cat = "error"
+                logger.error(ls_msg)
+            history.append({'filename': f"{file_info['subdir_name']}/{file_info['filename']}", 'operation': 'Save to Volume', 'message': ls_msg, 'category': ls_cat, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+            if on_file: on_file(history[-1])
+    summary = (f"Saved {saved_count}/{len(batch_files)} files to local volume.", "success" if saved_count == len(batch_files) else "warning")
+    return {'history': history, 'flashes': [summary], 'message': summary[0], 'category': summary[1]}
+
+def github_upload_configured():
+    return bool(ENABLE_GITHUB_UPLOAD and GITHUB_TOKEN_FROM_ENV and GITHUB_TARGET_REPO_ENV)
+
+def upload_batch_to_github(batch_files, on_file=None):
+    history = []
+    uploaded_count = 0
+    if GITHUB_BATCH_COMMIT:
+        results = _upload_batch_to_github_internal(
+            GITHUB_TOKEN_FROM_ENV, GITHUB_TARGET_REPO_ENV, GITHUB_UPLOAD_PATH_ENV,
+            [(f['subdir_name'], f['filename'], ARTIFACT_STORE.read_content(f)) for f in batch_files],
+            USER_SET_GITHUB_COMMIT_MSG, GITHUB_UPLOAD_BRANCH_ENV
+        )
+    else:
+        results = (_upload_to_github_internal(
+            GITHUB_TOKEN_FROM_ENV, GITHUB_TARGET_REPO_ENV, GITHUB_UPLOAD_PATH_ENV,
+            file_info['subdir_name'], ARTIFACT_STORE.read_content(file_info), file_info['filename'], 
+            USER_SET_GITHUB_COMMIT_MSG, GITHUB_UPLOAD_BRANCH_ENV
+        ) for file_info in batch_files)
+    for file_info, (gh_msg, gh_category) in zip(batch_files, results):
+        history.append({'filename': f"{file_info['subdir_name']}/{file_info['filename']}", 'operation': 'Batch GitHub Upload', 'message': gh_msg, 'category': gh_category, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+        if on_file: on_file(history[-1])
+        if gh_category == "success": uploaded_count += 1
+    summary = (f"Uploaded {uploaded_count}/{len(batch_files)} files to GitHub.", "info" if uploaded_count == len(batch_files) else "warning")
+    return {'history': history, 'flashes': [summary], 'message': summary[0], 'category': summary[1]}
+
+def run_host_snapshot():
+    """
+    Exports every running container to <output dir>/<SNAPSHOT_SUBDIR>/, writing (and
+    uploading to GitHub, if configured) only the files whose YAML changed since the last run.
+    """
+    results = HOSTS.fan_out(lambda host: ContainerSnapshot.from_running(host.require_client(), cache=host.metadata_cache), timeout=None)
+    snapshots = {name: snapshot for name, (snapshot, error) in results.items() if error is None}
+    for name, (_, error) in results.items():
+        if error is not None: logger.error(f"Snapshot: could not list containers on Docker host '{name}': {error}")
+    if not snapshots:
+        return {'message': "Snapshot skipped: could not connect to Docker.", 'category': 'danger', 'history': []}
+    containers = {HOSTS.get(name).container_key(c.id): c.attrs.get('Name', '').lstrip('/') or c.short_id
+                  for name, snapshot in snapshots.items() for c in snapshot.containers}
+    if not containers:
+        return {'message': "Snapshot skipped: no running containers.", 'category': 'info', 'history': []}
+    generated = generate_batch("generate_individuals", containers, snapshots, output_subdir_name=SNAPSHOT_SUBDIR)
+    try:
+        batch_files = ARTIFACT_STORE.load_batch(generated['batch_id'])
+        to_write = changed_files(batch_files, os.path.join(GENERATED_FILES_BASE_OUTPUT_DIR, SNAPSHOT_SUBDIR))
+        history = []
+        if to_write and SNAPSHOT_UPLOAD_GITHUB and github_upload_configured():
+            uploaded = upload_batch_to_github(to_write)
+            history.extend(uploaded['history'])
+            # Only keep the local copy in step with what reached GitHub, so failed files are retried next run
+            to_write = [f for f, entry in zip(to_write, uploaded['history']) if entry['category'] == 'success']
+        if to_write:
+            history.extend(save_batch_to_volume(to_write)['history'])
+    finally:
+        ARTIFACT_STORE.discard_batch(generated['batch_id'])
+    message = f"Snapshot of {len(batch_files)} container(s): {len(to_write)} file(s) changed."
+    return {'message': message, 'category': 'success', 'changed': [f['filename'] for f in to_write], 'history': history}
+
+def get_container_image_name(container_attrs, snapshot):
     try:
         if not isinstance(container_attrs, dict): return "Invalid Attrs"
         config = container_attrs.get('Config', {})
         if not isinstance(config, dict): return "Invalid Config"
         image_name_from_config = config.get('Image', 'Unknown Image')
-        if client and 'ImageID' in config and config['ImageID']:
+        if snapshot and 'ImageID' in config and config['ImageID']:
             try:
-                img_obj = client.images.get(config['ImageID'])
+                with metrics.phase('image_lookup'): img_obj = snapshot.get_image(config['ImageID'])
                 if img_obj.tags: return img_obj.tags[0]
             except Exception: pass 
         return image_name_from_config
@@ -186,6 +613,43 @@ def format_ports_info(ports_data):
             bindings.append(f"exposed {port}")
     return ", ".join(bindings) if bindings else "No exposed ports"
 
+def build_container_row(c_sdk, snapshot):
+    if not hasattr(c_sdk, 'attrs') or not isinstance(c_sdk.attrs, dict): return None
+    attrs = c_sdk.attrs
+    created_str = attrs.get('Created')
+    if not created_str or not isinstance(created_str, str): return None
+    created_dt = datetime.fromisoformat(created_str.split('.')[0])
+    net_settings = attrs.get('NetworkSettings', {})
+    ports = net_settings.get('Ports', {}) if isinstance(net_settings, dict) else {}
+    name = c_sdk.name or attrs.get('Name', '').lstrip('/') or c_sdk.short_id
+    networks = net_settings.get('Networks') if isinstance(net_settings, dict) else None
+    return {
+        'id': c_sdk.id, 'short_id': c_sdk.short_id, 'name': name,
+        'image': get_container_image_name(attrs, snapshot),
+        'ports': format_ports_info(ports), 
+        'created': created_dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'created_ts': created_dt.replace(tzinfo=timezone.utc).timestamp(), # Sort key, so sorting never re-parses dates
+        'networks': sorted(networks) if isinstance(networks, dict) else [],
+        'labels': (attrs.get('Config') or {}).get('Labels') or {}, # For filtering; not sent by /api/containers
+    }
+
+HOSTS = HostRegistry([
+    DockerHost(name, DockerConnection(base_url=url, max_pool_size=DOCKER_POOL_SIZE, health_interval=DOCKER_HEALTH_INTERVAL),
+               build_container_row, MetadataCache(maxsize=METADATA_CACHE_SIZE, ttl=METADATA_CACHE_TTL),
+               MetadataCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=None),
+               namespaced=len(DOCKER_HOST_SPECS) > 1, live_inventory=ENABLE_LIVE_INVENTORY)
+    for name, url in DOCKER_HOST_SPECS
+], timeout=DOCKER_HOST_TIMEOUT)
+DEFAULT_HOST = HOSTS.default
+# The default host's pieces, for code that only ever talks to one daemon
+DOCKER_CONNECTION = DEFAULT_HOST.connection
+INVENTORY = DEFAULT_HOST.inventory
+METADATA_CACHE = DEFAULT_HOST.metadata_cache
+FRAGMENT_CACHE = DEFAULT_HOST.fragment_cache
+metrics.DOCKER_RECONNECTS.set_function(lambda: {host.name: host.connection.reconnects for host in HOSTS})
+metrics.DOCKER_HEALTH_FAILURES.set_function(lambda: {host.name: host.connection.health_failures for host in HOSTS})
+SNAPSHOT_SCHEDULER = SnapshotScheduler(run_host_snapshot, SNAPSHOT_INTERVAL_MINUTES * 60, os.path.join(JOB_STATE_DIR, "snapshot.lock"))
+
 def toggle_container_selection_ajax(container_id, container_name_display): 
     if 'selected_containers' not in session:
         session['selected_containers'] = {}
@@ -199,6 +663,21 @@ def toggle_container_selection_ajax(container_id, container_name_display):
     session.modified = True
     return selected, len(session['selected_containers'])
 
+def change_selection(selected, clear=False, add=None, remove=(), select_rows=(), deselect_rows=()):
+    """
+    The selection (container key -> display name) after one bulk change, applied in order:
+    clear, deselect_rows, select_rows, remove (keys), add ({key: name}).
+    Returns (new selection, added keys, removed keys).
+    """
+    updated = {} if clear else dict(selected)
+    for row in deselect_rows: updated.pop(row['id'], None)
+    for row in select_rows: updated[row['id']] = row['name']
+    for key in remove: updated.pop(key, None)
+    updated.update(add or {})
+    added = [key for key in updated if key not in selected]
+    removed = [key for key in selected if key not in updated]
+    return updated, added, removed
+
 def select_all_containers(all_running_containers):
     session['selected_containers'] = {c['id']: c['name'] for c in all_running_containers}
     session.modified = True
@@ -207,18 +686,48 @@ def deselect_all_containers():
     session['selected_containers'] = {}
     session.modified = True
 
+def get_current_batch_files():
+    batch_id = session.get('current_batch_id')
+    return ARTIFACT_STORE.load_batch(batch_id) if batch_id else []
+
+def with_file_contents(batch_files):
+    files_with_content = []
+    for file_info in batch_files:
+        try: files_with_content.append(dict(file_info, content=ARTIFACT_STORE.read_content(file_info)))
+        except OSError as e: logger.error(f"Could not read generated file {file_info['temp_path']}: {e}")
+    return files_with_content
+
 def initialize_session_defaults():
     session.setdefault('selected_containers', {})
     session.setdefault('sort_by', 'name')
     session.setdefault('sort_order', 'asc')
     session.setdefault('num_cols', 3)
-    session.setdefault('job_history', []) 
-    session.setdefault('current_batch_files', []) 
+    session.setdefault('history_client_id', secrets.token_hex(16))
+    session.setdefault('current_batch_id', None) 
+    session.pop('current_batch_files', None) # Pre-artifact-store sessions carried full file contents
+    legacy_history = session.pop('job_history', None) # Pre-history-store sessions carried the last 50 entries
+    if legacy_history: record_history(legacy_history)
+
+def record_history(entries):
+    """Adds entries (newest first) to this session's job history."""
+    if entries: HISTORY.append(session['history_client_id'], entries)
+
+@app.before_request
+def ensure_started():
+    startup()
 
 @app.before_request
 def ensure_session_defaults():
+    if request.endpoint == 'metrics_endpoint': return # Scrapers don't need (or keep) a session
+    session_cookie = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+    if session_cookie: metrics.SESSION_BYTES.set(len(session_cookie))
     initialize_session_defaults()
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format. Each gunicorn worker keeps its own counters."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/api/toggle_selection', methods=['POST'])
 def api_toggle_selection():
     data = request.get_json()
@@ -230,38 +739,280 @@ def api_toggle_selection():
     return jsonify(success=True, id=container_id, name=container_name, selected=is_selected, selected_count=count)
 
 
+SELECTION_FILTER_KEYS = {'name', 'image', 'network', 'label'}
+
+def _selection_filter(value):
+    """Validates a select_matching/deselect_matching filter into row_matches() keyword arguments."""
+    if not isinstance(value, dict) or set(value) - SELECTION_FILTER_KEYS:
+        raise ValueError(f"A filter is an object with keys {', '.join(sorted(SELECTION_FILTER_KEYS))}.")
+    labels = value.get('label') or []
+    labels = [labels] if isinstance(labels, str) else labels
+    if not all(isinstance(value.get(key) or '', str) for key in ('name', 'image', 'network')) or not all(isinstance(label, str) for label in labels):
+        raise ValueError("Filter values must be strings.")
+    return {'name': value.get('name'), 'image': value.get('image'), 'network': value.get('network'), 'labels': labels}
+
+@app.route('/api/selection', methods=['GET', 'POST'])
+def api_selection():
+    """
+    GET: the selected containers. POST: changes the selection in one request, applied in order:
+    "clear": true; "deselect_matching" / "select_matching": a filter over the running containers
+    ({"name", "image", "network", "label"}, the /api/containers filters; {} matches all);
+    "remove": [container key]; "add": {container key: name}.
+    Returns the keys that were added and removed, and the new count.
+    """
+    selected = session.get('selected_containers', {})
+    if request.method == 'GET':
+        return jsonify(success=True, selected=selected, selected_count=len(selected))
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(success=False, error="Expected a JSON object."), 400
+    add, remove = data.get('add') or {}, data.get('remove') or []
+    if not isinstance(add, dict) or not all(isinstance(k, str) and k and isinstance(v, str) and v for k, v in add.items()):
+        return jsonify(success=False, error="'add' maps container keys to names."), 400
+    if not isinstance(remove, list) or not all(isinstance(key, str) for key in remove):
+        return jsonify(success=False, error="'remove' is a list of container keys."), 400
+    try:
+        filters = {op: _selection_filter(data[op]) for op in ('select_matching', 'deselect_matching') if data.get(op) is not None}
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+
+    matched, errors = {}, {}
+    if filters:
+        results = HOSTS.fan_out(lambda host: host.list_rows(INVENTORY_READY_TIMEOUT)[0])
+        errors = {name: str(error) for name, (_, error) in results.items() if error is not None}
+        if len(errors) == len(results):
+            return jsonify(success=False, error="; ".join(errors.values()) or "Could not connect to Docker.", unavailable=errors), 503
+        rows = [row for rows, error in results.values() if error is None for row in rows]
+        matched = {op: [row for row in rows if row_matches(row, **row_filter)] for op, row_filter in filters.items()}
+
+    updated, added, removed = change_selection(selected, clear=bool(data.get('clear')), add=add, remove=remove,
+                                               select_rows=matched.get('select_matching', ()), deselect_rows=matched.get('deselect_matching', ()))
+    if added or removed:
+        session['selected_containers'] = updated # One cookie write for the whole change
+    return jsonify(success=True, added=added, removed=removed, selected_count=len(updated), unavailable=errors)
+
+@app.route('/api/docker_status')
+def api_docker_status():
+    """The default host's connection stats, plus every configured host's under 'hosts'."""
+    return jsonify(dict(DOCKER_CONNECTION.stats(), hosts={host.name: host.connection.stats() for host in HOSTS}))
+
+
+def ready_hosts():
+    """Hosts whose live inventory is connected and synced, waiting for them concurrently; and {name: error} for the rest."""
+    def check(host):
+        host.require_client()
+        if not host.inventory.wait_ready(timeout=INVENTORY_READY_TIMEOUT): raise TimeoutError("Container inventory is not ready yet.")
+        return host
+    results = HOSTS.fan_out(check)
+    return ([host for host, error in results.values() if error is None],
+            {name: str(error) for name, (_, error) in results.items() if error is not None})
+
+@app.route('/api/inventory')
+def api_inventory():
+    if not ENABLE_LIVE_INVENTORY:
+        return jsonify(success=False, error="Container inventory is not ready yet."), 503
+    hosts, errors = ready_hosts()
+    if not hosts:
+        return jsonify(success=False, error="; ".join(errors.values()) or "Could not connect to Docker.", unavailable=errors), 503
+    return jsonify(success=True, version=sum(host.inventory.version for host in hosts),
+                   containers=[row for host in hosts for row in host.inventory.rows()], unavailable=errors)
+
+@app.route('/api/inventory/stream')
+def api_inventory_stream():
+    if not ENABLE_LIVE_INVENTORY:
+        return jsonify(success=False, error="Live inventory is not available."), 503
+    live_host_names = [name for name, (client, _) in HOSTS.fan_out(lambda host: host.get_client()).items() if client is not None]
+    if not live_host_names:
+        return jsonify(success=False, error="Live inventory is not available."), 503
+    inventories = [HOSTS.get(name).inventory for name in live_host_names]
+    if INVENTORY_STREAM_SLOTS is None or not INVENTORY_STREAM_SLOTS.acquire(blocking=False):
+        response = jsonify(success=False, error="Too many open live inventory streams; poll /api/containers instead.",
+                           retry_after=INVENTORY_STREAM_RETRY_SECONDS)
+        response.status_code = 503
+        response.headers['Retry-After'] = str(INVENTORY_STREAM_RETRY_SECONDS)
+        return response
+
+    def event_stream():
+        q = queue.Queue(maxsize=1000)
+        for inventory in inventories: inventory.subscribe(q=q) # One stream for every host
+        deadline = time.monotonic() + INVENTORY_STREAM_MAX_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            while time.monotonic() < deadline:
+                try:
+                    delta = q.get(timeout=15)
+                    yield f"event: {delta['type']}\ndata: {json.dumps(delta)}\n\n"
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            for inventory in inventories: inventory.unsubscribe(q)
+
+    response = Response(event_stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(INVENTORY_STREAM_SLOTS.release) # Runs even if the client leaves before the first chunk
+    return response
+
+
+CONTAINER_PAGE_DEFAULT_LIMIT = 100
+CONTAINER_PAGE_MAX_LIMIT = 500
+
+@app.route('/api/history')
+def api_history():
+    """
+    One page of this session's job history, newest first.
+    Query: q (matches operation, filename and message), limit, cursor (the next_cursor of the previous page).
+    """
+    try:
+        limit = max(1, min(HISTORY_PAGE_MAX_LIMIT, int(request.args.get('limit', HISTORY_PAGE_DEFAULT_LIMIT))))
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify(success=False, error="limit and cursor must be integers."), 400
+    entries, next_cursor = HISTORY.page(session['history_client_id'], limit, cursor=cursor, search=request.args.get('q', '').strip() or None)
+    return jsonify(success=True, entries=entries, next_cursor=next_cursor)
+
+@app.route('/api/containers')
+def api_containers():
+    """
+    One page of running containers across all hosts.
+    Query: sort_by (name|image|created), sort_order (asc|desc), name, image, label (repeatable,
+    "key" or "key=value"), network, limit, cursor (the next_cursor of the previous page).
+    Responses carry an ETag; with a live inventory it is derived from the inventory versions,
+    so an unchanged page is answered with 304 without being rebuilt.
+    """
+    sort_by = request.args.get('sort_by') or session.get('sort_by', 'name')
+    if sort_by not in SORT_FIELDS: return jsonify(success=False, error=f"Unknown sort field: {sort_by}"), 400
+    descending = (request.args.get('sort_order') or session.get('sort_order', 'asc')) == 'desc'
+    try:
+        limit = max(1, min(CONTAINER_PAGE_MAX_LIMIT, int(request.args.get('limit', CONTAINER_PAGE_DEFAULT_LIMIT))))
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    selected = session.get('selected_containers', {})
+
+    results = HOSTS.fan_out(lambda host: host.list_rows(INVENTORY_READY_TIMEOUT))
+    errors = {name: str(error) for name, (_, error) in results.items() if error is not None}
+    if len(errors) == len(results):
+        return jsonify(success=False, error="; ".join(errors.values()) or "Could not connect to Docker.", unavailable=errors), 503
+    etag = None
+    if ENABLE_LIVE_INVENTORY and all(HOSTS.get(name).inventory.ready for name in results if name not in errors):
+        state = [os.getpid(), sorted(errors), sorted(selected), request.query_string.decode('utf-8'), sort_by, descending]
+        state += [(id(HOSTS.get(name).inventory), HOSTS.get(name).inventory.version) for name in results if name not in errors]
+        etag = hashlib.sha1(json.dumps(state, default=str).encode('utf-8')).hexdigest()
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+
+    rows = [row for name, (listing, error) in results.items() if error is None for row in listing[0]]
+    try:
+        page, next_cursor, total = query_rows(rows, sort_by, descending, cursor, limit,
+                                              name=request.args.get('name'), image=request.args.get('image'),
+                                              labels=request.args.getlist('label'), network=request.args.get('network'))
+    except TypeError:
+        return jsonify(success=False, error="Cursor does not match the sort field."), 400
+    containers = [dict({k: v for k, v in row.items() if k != 'labels'}, selected=row['id'] in selected) for row in page]
+    response = jsonify(success=True, containers=containers, next_cursor=next_cursor, total=total,
+                       selected_count=len(selected), unavailable=errors)
+    response.headers['Cache-Control'] = 'no-cache' # Revalidate with If-None-Match instead of re-downloading
+    if etag: response.set_etag(etag)
+    else: response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    data = request.get_json(silent=True) or request.form
+    action = data.get('action')
+    if action == "generate_projects":
+        # One listing per host gives both the project index and the snapshot generation reads from
+        listings = HOSTS.fan_out(lambda host: host.list_projects(INVENTORY_READY_TIMEOUT))
+        errors = {name: error for name, (_, error) in listings.items() if error is not None}
+        if len(errors) == len(listings):
+            return jsonify(success=False, error="; ".join(str(e) for e in errors.values()) or "Could not connect to Docker."), 503
+        snapshots = {name: listing[1] for name, (listing, error) in listings.items() if error is None}
+        projects = select_projects({name: listing[0] for name, (listing, error) in listings.items() if error is None}, data.get('project'))
+        if not projects:
+            error = f"Unknown compose project: {data.get('project')}" if data.get('project') else "No running containers belong to a compose project."
+            return jsonify(success=False, error=error), 400
+        ARTIFACT_STORE.discard_batch(session.pop('current_batch_id', None)) # Only this session's previous batch
+        total = generation_job_count(action, {}, projects)
+        def work(progress):
+            on_result = lambda r: progress.file_done(r['file_info']['filename'] if r['file_info'] else r['base_name'], r['history'][-1]['message'], r['history'][-1]['category'])
+            return generate_batch(action, {}, snapshots, on_result=on_result, projects=projects)
+    elif action in GENERATE_ACTIONS:
+        selected_containers = dict(session.get('selected_containers', {}))
+        if not selected_containers:
+            return jsonify(success=False, error="No containers selected for generation."), 400
+        snapshots, errors = host_snapshots(group_by_host(selected_containers)[0])
+        if not snapshots:
+            return jsonify(success=False, error="; ".join(str(e) for e in errors.values()) or "Could not connect to Docker."), 503
+        ARTIFACT_STORE.discard_batch(session.pop('current_batch_id', None)) # Only this session's previous batch
+        total = generation_job_count(action, selected_containers)
+        def work(progress):
+            on_result = lambda r: progress.file_done(r['file_info']['filename'] if r['file_info'] else r['base_name'], r['history'][-1]['message'], r['history'][-1]['category'])
+            return generate_batch(action, selected_containers, snapshots, on_result=on_result)
+    elif action in BATCH_JOB_ACTIONS:
+        batch_files = get_current_batch_files()
+        if not batch_files:
+            return jsonify(success=False, error="No files generated in the current batch to perform action on."), 400
+        if action == "upload_all_github" and not github_upload_configured():
+            return jsonify(success=False, error="GitHub upload is not enabled or fully configured via ENV variables."), 400
+        total = len(batch_files)
+        batch_function = save_batch_to_volume if action == "save_all_local" else upload_batch_to_github
+        def work(progress):
+            return batch_function(batch_files, on_file=lambda entry: progress.file_done(entry['filename'], entry['message'], entry['category']))
+    else:
+        return jsonify(success=False, error=f"Unknown job action: {action}"), 400
+
+    job_id = JOBS.submit(action, work, total=total)
+    session['pending_job_ids'] = (session.get('pending_job_ids', []) + [job_id])[-20:]
+    return jsonify(success=True, job_id=job_id, status_url=url_for('check_job_status', job_id=job_id)), 202
+
+@app.route('/api/snapshot', methods=['GET', 'POST'])
+def api_snapshot():
+    """GET: scheduler status and the last result. POST: run a snapshot now as a background job."""
+    if request.method == 'GET':
+        return jsonify(SNAPSHOT_SCHEDULER.status())
+    def work(progress):
+        return SNAPSHOT_SCHEDULER.run_once(force=True) or {'message': "Another snapshot is already running.", 'category': 'warning'}
+    job_id = JOBS.submit('host_snapshot', work, total=0)
+    return jsonify(success=True, job_id=job_id, status_url=url_for('check_job_status', job_id=job_id)), 202
+
+@app.route('/check_job_status/<job_id>')
+def check_job_status(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify(status='not_found', message="Unknown job.", category='danger'), 404
+    pending = session.get('pending_job_ids', [])
+    if job['status'] in ('completed', 'failed') and job_id in pending:
+        # First poll after completion in the submitting session: publish the results to it
+        result = job.get('result') or {}
+        if result.get('batch_id'): session['current_batch_id'] = result['batch_id']
+        record_history(result.get('history'))
+        for message, category in result.get('flashes', []): flash(message, category)
+        if job['status'] == 'failed': flash(job['message'], job['category'])
+        session['pending_job_ids'] = [j for j in pending if j != job_id]
+    job.pop('result', None)
+    return jsonify(job)
+
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    client = get_docker_client() 
+    snapshots = {} # Containers are listed/inspected once per request and host, and shared with generation
     running_containers_data = []
-    error_message = None
-    docker_connected = bool(client)
-    current_job_history = session.get('job_history', []) 
-    
-    generated_files_for_template = session.get('current_batch_files', [])
+    projects = {} # host name -> {compose project: [row]}, indexed from the same listing
+    host_errors = []
+    current_batch = get_current_batch_files()
 
-    if client:
-        try:
-            fetched_containers_sdk = client.containers.list(all=False)
-            for c_sdk in fetched_containers_sdk:
-                try:
-                    if not hasattr(c_sdk, 'attrs') or not isinstance(c_sdk.attrs, dict): continue
-                    attrs = c_sdk.attrs
-                    created_str = attrs.get('Created')
-                    if not created_str or not isinstance(created_str, str): continue
-                    created_dt = datetime.fromisoformat(created_str.split('.')[0])
-                    net_settings = attrs.get('NetworkSettings', {})
-                    ports = net_settings.get('Ports', {}) if isinstance(net_settings, dict) else {}
-                    name = c_sdk.name or attrs.get('Name', '').lstrip('/') or c_sdk.short_id
-                    running_containers_data.append({
-                        'id': c_sdk.id, 'short_id': c_sdk.short_id, 'name': name,
-                        'image': get_container_image_name(attrs, client),
-                        'ports': format_ports_info(ports), 
-                        'created': created_dt.strftime('%Y-%m-%d %H:%M:%S') 
-                    })
-                except Exception as e_inner: logger.error(f"Error processing container {c_sdk.id if hasattr(c_sdk, 'id') else 'UnknownID'}: {e_inner}")
-        except Exception as e: error_message = f"Error fetching list: {e}"; logger.error(error_message)
-    else: error_message = "Could not connect to Docker."
+    # Every host is queried at once; a slow or unreachable one only costs DOCKER_HOST_TIMEOUT
+    for host_name, (listing, error) in HOSTS.fan_out(lambda host: host.list_rows(INVENTORY_READY_TIMEOUT)).items():
+        host_label = f"Docker host '{host_name}': " if HOSTS.namespaced else ""
+        if isinstance(error, ConnectionError):
+            host_errors.append(f"{host_label}Could not connect to Docker.")
+        elif error is not None:
+            host_errors.append(f"{host_label}Error fetching list: {error}"); logger.error(host_errors[-1])
+        else:
+            rows, snapshots[host_name] = listing
+            running_containers_data.extend(rows)
+            projects[host_name] = project_index(rows)
+    docker_connected = bool(snapshots)
+    error_message = " ".join(host_errors) or None
 
     if request.method == 'POST':
         action_taken_this_post = False
@@ -272,8 +1023,7 @@ def index():
             action_taken_this_post = True
         
         elif 'clear_job_history_action' in request.form:
-            session['job_history'] = []
-            current_job_history = [] 
+            HISTORY.clear(session['history_client_id'])
             flash("Job history cleared.", "info")
             action_taken_this_post = True
 
@@ -301,125 +1051,73 @@ def index():
             if not selected_ids:
                 flash("No containers selected for generation.", "warning") 
             else:
-                clear_and_recreate_temp_dir() # Clear entire temp dir before new generation
-                session['current_batch_files'] = [] # Clear previous batch from session display
-                
-                temp_generated_files_info_for_session = [] 
-                output_subdir_name = generate_timestamped_dirname()
-                
-                def handle_single_temp_generation(ids, base_name, subdir):
-                    stdout, stderr, rc = run_autocompose_script(ids) 
-                    if rc == 0 and stdout:
-                        sanitized_base = sanitize_filename_base(base_name)
-                        simple_filename = f"{sanitized_base}.yml" 
-                        
-                        temp_path, ls_msg, ls_cat = save_to_temp_and_get_info(stdout, subdir, simple_filename)
-                        post_specific_job_history.append({'filename': f"{subdir}/{simple_filename}", 'operation': 'Temp Save', 'message': ls_msg, 'category': ls_cat, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
-                        
-                        if temp_path: 
-                            temp_generated_files_info_for_session.append({
-                                "filename": simple_filename, 
-                                "content": stdout, 
-                                "subdir_name": subdir, 
-                                "temp_path": temp_path 
-                            })
-                    else: 
-                        flash(f"Error generating compose for '{base_name}': {stderr or 'Unknown error'}", "danger")
-                        post_specific_job_history.append({'filename': base_name, 'operation': 'Generation', 'message': f"Error generating compose: {stderr or 'Unknown error'}", 'category': 'danger', 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
-
-                if generate_button_value == "generate_stack":
-                    base_name_for_combined = session['selected_containers'][selected_ids[0]] if len(selected_ids) == 1 else "docker_stack"
-                    handle_single_temp_generation(selected_ids, base_name_for_combined, output_subdir_name)
-                elif generate_button_value == "generate_individuals":
-                    s_count = 0
-                    for c_id, c_name in session['selected_containers'].items():
-                        if c_id not in selected_ids: continue 
-                        handle_single_temp_generation([c_id], c_name, output_subdir_name)
-                        s_count +=1 
-                    if s_count > 0 : 
-                        flash(f"Generated {s_count} of {len(selected_ids)} files.", "info") # Simplified message
-                
-                session['current_batch_files'] = temp_generated_files_info_for_session 
+                ARTIFACT_STORE.discard_batch(session.pop('current_batch_id', None)) # Only this session's previous batch
+                outcome = generate_batch(generate_button_value, session['selected_containers'], snapshots)
+                post_specific_job_history.extend(outcome['history'])
+                for message, category in outcome['flashes']: flash(message, category)
+                session['current_batch_id'] = outcome['batch_id'] 
         
+        elif generate_button_value == "generate_projects":
+            action_taken_this_post = True
+            selected_projects = select_projects(projects, request.form.get('compose_project'))
+            if not selected_projects:
+                flash("No running containers belong to that compose project.", "warning")
+            else:
+                ARTIFACT_STORE.discard_batch(session.pop('current_batch_id', None))
+                outcome = generate_batch(generate_button_value, {}, snapshots, projects=selected_projects)
+                post_specific_job_history.extend(outcome['history'])
+                for message, category in outcome['flashes']: flash(message, category)
+                session['current_batch_id'] = outcome['batch_id']
+
         elif generate_button_value == "clear_generated": 
             action_taken_this_post = True
-            session.pop('current_batch_files', None) 
-            clear_and_recreate_temp_dir() 
+            ARTIFACT_STORE.discard_batch(session.pop('current_batch_id', None)) 
+            current_batch = []
             post_specific_job_history.append({'filename': 'N/A', 'operation': 'Clear Batch', 'message': "Generated files display and temporary storage cleared.", 'category': 'info', 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
             flash("Generated files display and temporary storage cleared.", "info") 
                 
         batch_action_value = request.form.get('batch_action')
         if batch_action_value:
             action_taken_this_post = True
-            current_batch = session.get('current_batch_files', [])
             if not current_batch:
                 flash("No files generated in the current batch to perform action on.", "warning")
             else:
                 if batch_action_value == "save_all_local":
-                    saved_count = 0
-                    for file_info in current_batch:
-                        final_output_dir_for_batch = os.path.join(GENERATED_FILES_BASE_OUTPUT_DIR, file_info['subdir_name'])
-                        final_save_path = os.path.join(final_output_dir_for_batch, file_info['filename'])
-                        try:
-                            os.makedirs(final_output_dir_for_batch, exist_ok=True)
-                            with open(file_info['temp_path'], 'r', encoding='utf-8') as src_f, \
-                                 open(final_save_path, 'w', encoding='utf-8') as dest_f:
-                                dest_f.write(src_f.read())
-                            ls_msg = f"✅ Saved to local volume: `{file_info['subdir_name']}/{file_info['filename']}`."
-                            ls_cat = "success"
-                            saved_count +=1
-                        except Exception as e:
-                            ls_msg = f"🔥 Error saving {file_info['filename']} to local volume: {e}"
-                            ls_cat = "error"
-                            logger.error(ls_msg)
-                        post_specific_job_history.append({'filename': f"{file_info['subdir_name']}/{file_info['filename']}", 'operation': 'Save to Volume', 'message': ls_msg, 'category': ls_cat, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
-                    flash(f"Saved {saved_count}/{len(current_batch)} files to local volume.", "success" if saved_count == len(current_batch) else "warning")
+                    outcome = save_batch_to_volume(current_batch)
+                    post_specific_job_history.extend(outcome['history'])
+                    for message, category in outcome['flashes']: flash(message, category)
 
                 elif batch_action_value == "upload_all_github":
-                    if not (ENABLE_GITHUB_UPLOAD and GITHUB_TOKEN_FROM_ENV and GITHUB_TARGET_REPO_ENV):
+                    if not github_upload_configured():
                         flash("GitHub upload is not enabled or fully configured via ENV variables.", "danger")
                     else:
-                        uploaded_count = 0
-                        for file_info in current_batch:
-                            gh_msg, gh_category = _upload_to_github_internal(
-                                GITHUB_TOKEN_FROM_ENV, GITHUB_TARGET_REPO_ENV, GITHUB_UPLOAD_PATH_ENV,
-                                file_info['subdir_name'], file_info['content'], file_info['filename'], 
-                                USER_SET_GITHUB_COMMIT_MSG, GITHUB_UPLOAD_BRANCH_ENV
-                            )
-                            post_specific_job_history.append({'filename': f"{file_info['subdir_name']}/{file_info['filename']}", 'operation': 'Batch GitHub Upload', 'message': gh_msg, 'category': gh_category, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
-                            if gh_category == "success": uploaded_count += 1
-                        flash(f"Uploaded {uploaded_count}/{len(current_batch)} files to GitHub.", "info" if uploaded_count == len(current_batch) else "warning")
+                        outcome = upload_batch_to_github(current_batch)
+                        post_specific_job_history.extend(outcome['history'])
+                        for message, category in outcome['flashes']: flash(message, category)
                 
                 elif batch_action_value == "download_all_zip":
-                    memory_file = io.BytesIO()
                     zip_subdir_name = current_batch[0]['subdir_name'] if current_batch else "compose_files"
                     zip_filename = f"{zip_subdir_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-                    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-                        for file_item in current_batch:
-                            zf.writestr(os.path.join(file_item['subdir_name'], file_item['filename']), file_item['content'])
-                    memory_file.seek(0)
+                    entries = [(f['temp_path'], f"{f['subdir_name']}/{f['filename']}") for f in current_batch]
                     post_specific_job_history.append({'filename': zip_filename, 'operation': 'ZIP Download', 'message': f"ZIP file '{zip_filename}' prepared.", 'category': 'info', 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
-                    session['job_history'] = post_specific_job_history + session.get('job_history', [])[:49]
-                    session.modified = True
-                    return send_file(memory_file, download_name=zip_filename, as_attachment=True, mimetype='application/zip')
-
-        if post_specific_job_history:
-            updated_job_history = post_specific_job_history + session.get('job_history', [])
-            session['job_history'] = updated_job_history[:50] 
-            session.modified = True
+                    record_history(post_specific_job_history)
+                    return zip_download_response(entries, zip_filename)
+
+        record_history(post_specific_job_history)
         
         if action_taken_this_post and not (generate_button_value == "download_zip" or batch_action_value == "download_all_zip"): 
             return redirect(url_for('index', sort_by=session.get('sort_by'), sort_order=session.get('sort_order')))
 
     current_sort_by = session.get('sort_by', 'name')
     current_sort_order = session.get('sort_order', 'asc')
-    reverse_sort = (current_sort_order == 'desc')
-    if current_sort_by == 'name': running_containers_data.sort(key=lambda c: c.get('name', '').lower(), reverse=reverse_sort)
-    elif current_sort_by == 'created': running_containers_data.sort(key=lambda c: datetime.strptime(c.get('created', '1970-01-01 00:00:00'), '%Y-%m-%d %H:%M:%S'), reverse=reverse_sort)
-    elif current_sort_by == 'image': running_containers_data.sort(key=lambda c: c.get('image', '').lower(), reverse=reverse_sort)
+    job_history, history_cursor = HISTORY.page(session['history_client_id'], HISTORY_PAGE_DEFAULT_LIMIT)
+    compose_projects = {}
+    for host_projects in projects.values():
+        for project, rows in host_projects.items(): compose_projects[project] = compose_projects.get(project, 0) + len(rows)
     
     template_context = {
-        "containers": running_containers_data,
+        "container_count": len(running_containers_data), # The grid itself is loaded page by page from /api/containers
+        "compose_projects": sorted(compose_projects.items()),
         "selected_containers": session.get('selected_containers', {}),
         "error_message": error_message, "docker_connected": docker_connected,
         "current_sort_by": current_sort_by, "current_sort_order": current_sort_order,
@@ -432,19 +1130,43 @@ def index():
         "GITHUB_UPLOAD_PATH_ENV": GITHUB_UPLOAD_PATH_ENV,
         "GITHUB_UPLOAD_BRANCH_ENV": GITHUB_UPLOAD_BRANCH_ENV,
         "USER_SET_GITHUB_COMMIT_MSG": USER_SET_GITHUB_COMMIT_MSG, 
-        "generated_files": generated_files_for_template, 
-        "job_history": current_job_history, 
-        "current_batch_files": session.get('current_batch_files', []) 
+        "generated_files": with_file_contents(current_batch), 
+        "job_history": job_history, "history_next_cursor": history_cursor,
+        "current_batch_files": current_batch 
     }
     return render_template('index.html', **template_context)
 
+def zip_download_response(entries, zip_filename):
+    """Streams the ZIP to the client as it is built, so nothing is buffered in memory."""
+    from zip_stream import stream_zip # Loaded on the first download
+    return Response(stream_with_context(metrics.timed_iter('zip_build', stream_zip(entries))), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{zip_filename}"'})
+
+@app.route('/download_saved_zip/', defaults={'subdir': ''})
+@app.route('/download_saved_zip/<path:subdir>')
+def download_saved_zip(subdir):
+    """ZIP of a saved batch directory under GENERATED_FILES_BASE_OUTPUT_DIR, or of everything saved so far."""
+    directory = safe_join(GENERATED_FILES_BASE_OUTPUT_DIR, subdir) if subdir else GENERATED_FILES_BASE_OUTPUT_DIR
+    if not directory or not os.path.isdir(directory):
+        flash(f"Saved directory '{subdir or GENERATED_FILES_BASE_OUTPUT_DIR}' not found.", "danger")
+        return redirect(url_for('index'))
+    zip_base_name = sanitize_filename_base(subdir.strip("/").replace("/", "_")) if subdir else "saved_compose_files"
+    zip_filename = f"{zip_base_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    logger.info(f"Streaming ZIP of saved directory '{directory}' as '{zip_filename}'")
+    from zip_stream import directory_entries
+    return zip_download_response(directory_entries(directory, subdir.strip("/")), zip_filename)
+
 @app.route('/download_temp/<path:subdir>/<path:filename>') 
 def download_temp_file(subdir, filename):
     if ".." in subdir or subdir.startswith("/") or ".." in filename or filename.startswith("/"):
         flash("Invalid file path for download.", "danger")
         return redirect(url_for('index'))
         
-    directory = os.path.abspath(os.path.join(TEMP_COMPOSE_DIR, subdir))
+    batch_id = session.get('current_batch_id')
+    if not batch_id:
+        flash("No generated batch to download from.", "warning")
+        return redirect(url_for('index'))
+    directory = os.path.abspath(os.path.join(ARTIFACT_STORE.batch_dir(batch_id), subdir))
     logger.info(f"Attempting to download temporary file '{filename}' from directory '{directory}'")
     try:
         return send_from_directory(directory, filename, as_attachment=True)
@@ -458,11 +1180,15 @@ def download_temp_file(subdir, filename):
         return redirect(url_for('index'))
 
 if __name__ == '__main__':
+    if '--snapshot-once' in sys.argv[1:]: # For cron: export the host once and exit
+        result = SNAPSHOT_SCHEDULER.run_once(force=True)
+        print(result['message'] if result else "Another snapshot is already running.")
+        sys.exit(0 if result and result.get('category') != 'danger' else 1)
     if not os.path.exists(GENERATED_FILES_BASE_OUTPUT_DIR): 
         try: 
             os.makedirs(GENERATED_FILES_BASE_OUTPUT_DIR)
             logger.info(f"Created base output directory: {GENERATED_FILES_BASE_OUTPUT_DIR}")
         except OSError as e: 
             logger.error(f"Could not create base output directory {GENERATED_FILES_BASE_OUTPUT_DIR}: {e}")
-    # Initial cleanup of TEMP_COMPOSE_DIR is handled at the top of the script now.
+    startup()
     app.run(debug=True, host='0.0.0.0', port=5000)
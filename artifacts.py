@@ -0,0 +1,233 @@
+# Server-side storage for generated compose files, so the session only carries a batch ID.
+
+import os
+import json
+import uuid
+import time
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+TRASH_PREFIX = ".trash-"
+
+class ArtifactStore:
+    """
+    Keeps each generated batch on disk under <root_dir>/<batch_id>/<subdir_name>/<filename>,
+    with a small manifest.json listing the files in generation order.
+
+    Every batch is its own workspace, so concurrent users and workers never touch each
+    other's files. Discarding a batch is a single rename into the trash; the reaper thread
+    does the actual deletion, and expires batches by age and by a total disk quota.
+    """
+    def __init__(self, root_dir):
+        self.root_dir = os.path.abspath(root_dir)
+        self._reaper_thread = None
+        self._reaper_lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_batch_id(batch_id):
+        return isinstance(batch_id, str) and len(batch_id) == 32 and all(c in '0123456789abcdef' for c in batch_id)
+
+    def batch_dir(self, batch_id):
+        if not self.is_valid_batch_id(batch_id):
+            raise ValueError(f"Invalid batch ID: {batch_id!r}")
+        return os.path.join(self.root_dir, batch_id)
+
+    def ensure_root(self):
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def create_batch(self, subdir_name):
+        self.ensure_root()
+        batch_id = uuid.uuid4().hex
+        os.mkdir(self.batch_dir(batch_id)) # Atomic; fails rather than sharing a workspace
+        os.mkdir(os.path.join(self.batch_dir(batch_id), subdir_name))
+        self.write_manifest(batch_id, subdir_name, [])
+        return batch_id
+
+    def file_path(self, batch_id, subdir_name, filename):
+        return os.path.join(self.batch_dir(batch_id), subdir_name, filename)
+
+    def write_manifest(self, batch_id, subdir_name, filenames, details=None):
+        """details optionally maps filename -> extra keys merged into that file's info by load_batch()."""
+        manifest_path = os.path.join(self.batch_dir(batch_id), MANIFEST_NAME)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({'batch_id': batch_id, 'subdir_name': subdir_name, 'files': filenames, 'details': details or {}}, f)
+        os.replace(tmp_path, manifest_path)
+
+    def load_batch(self, batch_id):
+        """Returns the batch's file infos ({'filename', 'subdir_name', 'temp_path'}) in order, or [] if it is gone."""
+        try:
+            with open(os.path.join(self.batch_dir(batch_id), MANIFEST_NAME), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            if batch_id: logger.warning(f"Could not load batch manifest for '{batch_id}': {e}")
+            return []
+        subdir_name = manifest.get('subdir_name', '')
+        details = manifest.get('details') or {}
+        return [dict(details.get(filename) or {}, filename=filename, subdir_name=subdir_name, temp_path=self.file_path(batch_id, subdir_name, filename))
+                for filename in manifest.get('files', [])]
+
+    @staticmethod
+    def read_content(file_info):
+        with open(file_info['temp_path'], encoding="utf-8") as f:
+            return f.read()
+
+    def delete_batch(self, batch_id):
+        if self.is_valid_batch_id(batch_id):
+            shutil.rmtree(self.batch_dir(batch_id), ignore_errors=True)
+
+    def discard_batch(self, batch_id):
+        """O(1) removal for the request path: rename into the trash, the reaper deletes it later."""
+        if not self.is_valid_batch_id(batch_id): return
+        try:
+            os.rename(self.batch_dir(batch_id), os.path.join(self.root_dir, f"{TRASH_PREFIX}{batch_id}"))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not discard batch '{batch_id}': {e}")
+
+    @staticmethod
+    def _tree_size(path):
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try: total += os.lstat(os.path.join(dirpath, filename)).st_size
+                except OSError: pass
+        return total
+
+    def total_size(self):
+        return self._tree_size(self.root_dir)
+
+    def reap(self, max_age_seconds=None, max_total_bytes=None):
+        """
+        Deletes trashed workspaces, workspaces older than max_age_seconds, then the oldest
+        remaining ones until the total size fits in max_total_bytes. Returns the number removed.
+        """
+        removed = 0
+        now = time.time()
+        workspaces = []
+        try:
+            entries = list(os.scandir(self.root_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False): continue
+            if entry.name.startswith(TRASH_PREFIX):
+                shutil.rmtree(entry.path, ignore_errors=True); removed += 1
+                continue
+            try: mtime = entry.stat(follow_symlinks=False).st_mtime
+            except OSError: continue
+            if max_age_seconds is not None and now - mtime > max_age_seconds:
+                shutil.rmtree(entry.path, ignore_errors=True); removed += 1
+            else:
+                workspaces.append((mtime, entry.path))
+        if max_total_bytes is not None and workspaces:
+            sized = [(mtime, path, self._tree_size(path)) for mtime, path in sorted(workspaces)]
+            total = sum(size for _, _, size in sized)
+            for mtime, path, size in sized:
+                if total <= max_total_bytes: break
+                shutil.rmtree(path, ignore_errors=True); removed += 1
+                total -= size
+        if removed: logger.info(f"Reaped {removed} temporary workspace(s) from {self.root_dir}")
+        return removed
+
+    def start_reaper(self, interval_seconds, max_age_seconds=None, max_total_bytes=None):
+        def loop():
+            while True:
+                try: self.reap(max_age_seconds, max_total_bytes)
+                except Exception as e: logger.error(f"Error reaping temporary workspaces: {e}")
+                time.sleep(interval_seconds)
+        with self._reaper_lock:
+            if self._reaper_thread is None or not self._reaper_thread.is_alive():
+                self._reaper_thread = threading.Thread(target=loop, name="autocompose-reaper", daemon=True)
+                self._reaper_thread.start()
+
+STAGING_PREFIX = ".staging-"
+
+def _kernel_copy(src_path, dst_path):
+    """Copies file data inside the kernel (copy_file_range, else shutil's sendfile path) and fsyncs it."""
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0: break
+                remaining -= copied
+        except (AttributeError, OSError): # Not Linux, or unsupported between these filesystems
+            remaining = -1
+    if remaining != 0:
+        shutil.copyfile(src_path, dst_path)
+    with open(dst_path, 'rb+') as dst:
+        os.fsync(dst.fileno())
+
+def _place_file(src_path, dst_path):
+    """Hardlinks src to dst when they share a filesystem, otherwise does a kernel-side copy. Returns the method used."""
+    try:
+        os.link(src_path, dst_path)
+    except OSError: # EXDEV (different filesystem), EPERM, EMLINK, ...
+        _kernel_copy(src_path, dst_path)
+        return "copy"
+    # dst now shares src's inode, so a copy onto it would truncate both; fsync errors propagate instead
+    with open(dst_path, 'rb') as f: os.fsync(f.fileno()) # The temp file itself was never synced
+    return "link"
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try: os.fsync(fd)
+    except OSError: pass
+    finally: os.close(fd)
+
+def _remove_stale_staging(dest_root, max_age_seconds=3600):
+    """Staging directories left behind by a crash mid-save."""
+    cutoff = time.time() - max_age_seconds
+    try:
+        for entry in os.scandir(dest_root):
+            if entry.name.startswith(STAGING_PREFIX) and entry.is_dir(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+    except OSError:
+        pass
+
+def save_batch_atomically(file_infos, dest_root, subdir_name):
+    """
+    Saves a batch's files to <dest_root>/<subdir_name>/ without copying data through Python.
+
+    Files are hardlinked (same filesystem) or copied with copy_file_range into a staging
+    directory next to the destination, fsync'ed, and the staging directory is renamed into
+    place, so a crash never leaves a half-written batch directory. If the destination
+    already exists, each file is swapped in with os.replace instead.
+    Returns one (file_info, error) pair per file; error is None on success.
+    """
+    os.makedirs(dest_root, exist_ok=True)
+    _remove_stale_staging(dest_root)
+    final_dir = os.path.join(dest_root, subdir_name)
+    staging_dir = os.path.join(dest_root, f"{STAGING_PREFIX}{uuid.uuid4().hex}")
+    os.mkdir(staging_dir)
+    results = []
+    try:
+        for file_info in file_infos:
+            try:
+                _place_file(file_info['temp_path'], os.path.join(staging_dir, file_info['filename']))
+                results.append((file_info, None))
+            except OSError as e:
+                results.append((file_info, e))
+        _fsync_dir(staging_dir)
+        try:
+            os.rename(staging_dir, final_dir) # Atomic publish of the whole directory
+        except OSError:
+            if not os.path.isdir(final_dir): raise
+            for i, (file_info, error) in enumerate(results): # Re-save into an existing batch directory
+                if error is not None: continue
+                try: os.replace(os.path.join(staging_dir, file_info['filename']), os.path.join(final_dir, file_info['filename']))
+                except OSError as e: results[i] = (file_info, e)
+            _fsync_dir(final_dir)
+        _fsync_dir(dest_root)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return results
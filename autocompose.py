@@ -6,7 +6,15 @@
 import docker
 import sys
 import argparse
+import io
 import os
+import json
+import hashlib
+import logging
+from inventory import ContainerSnapshot
+import metrics
+
+logger = logging.getLogger("autocompose")
 
 try:
     import pyaml 
@@ -17,248 +25,469 @@ except ImportError:
         try:
             import yaml as pyaml 
         except ImportError:
-            sys.stderr.write("Unable to import a YAML library. Please install pyyaml, ruamel.yaml, or pyaml.\n")
-            sys.exit(1)
+            pyaml = None # main() reports this; importers get an error from dump_compose()
+
+class _ServiceBuild:
+    """What the field converters share while one container is translated."""
+    __slots__ = ('container', 'attrs', 'snapshot', 'service_name', 'include_all_env_vars', 'include_default_volumes', 'networks', 'volumes')
+
+    def __init__(self, container, snapshot, service_name, include_all_env_vars, include_default_volumes):
+        self.container = container
+        self.attrs = container.attrs
+        self.snapshot = snapshot
+        self.service_name = service_name
+        self.include_all_env_vars = include_all_env_vars
+        self.include_default_volumes = include_default_volumes
+        self.networks = {} # Top-level networks this service needs
+        self.volumes = {} # Top-level volumes this service needs
+
+def _image(image_id, build):
+    config_img = (build.attrs.get('Config') or {}).get('Image')
+    try:
+        if image_id:
+            img = build.snapshot.get_image(image_id)
+            if img.tags: return img.tags[0]
+            if config_img: # Fallback to image name from container's config if no tags
+                logger.debug("Service '%s': image has no tags, using Config.Image", build.service_name)
+                return config_img
+            logger.warning("Service '%s': image has no tags and no Config.Image, using the image ID.", build.service_name)
+            return image_id
+        if config_img:
+            logger.debug("Service '%s': no image ID, using Config.Image", build.service_name)
+            return config_img
+        logger.warning("Could not determine image for %s. Both Image ID and Config.Image are missing.", build.service_name)
+    except docker.errors.ImageNotFound:
+        logger.debug("Service '%s': image ID not found, using Config.Image", build.service_name)
+        return config_img
+    except Exception as e:
+        logger.warning("Could not determine image for %s: %s. Using config image name if available.", build.service_name, e)
+        return (build.attrs.get('Config') or {}).get('Image', 'unknown_image_due_to_error')
+    return None
+
+def _excluded_env_keys(build):
+    """Keys listed in the container's AUTOCOMPOSE_EXCLUDE label, as a set."""
+    exclude_str = ((build.attrs.get('Config') or {}).get('Labels') or {}).get('AUTOCOMPOSE_EXCLUDE')
+    if not exclude_str: return frozenset()
+    excluded = frozenset(key.strip() for key in exclude_str.split(',') if key.strip())
+    logger.debug("Service '%s': AUTOCOMPOSE_EXCLUDE lists %d key(s)", build.service_name, len(excluded))
+    return excluded
+
+def _environment(env, build):
+    if not env: return None
+    excluded = _excluded_env_keys(build)
+    environment = {}
+    for env_var_str in env:
+        key, has_value_assignment, value = env_var_str.partition("=")
+        if not key: continue
+        if key in excluded:
+            logger.info("Excluding ENV VAR '%s' for service '%s' due to AUTOCOMPOSE_EXCLUDE label.", key, build.service_name)
+            continue
+        if has_value_assignment: environment[key] = value
+        elif build.include_all_env_vars: environment[key] = None
+    if not environment: return None
+    logger.debug("Service '%s': %d environment variable(s)", build.service_name, len(environment)) # Names and values stay out of the logs
+    return environment
+
+def _ports(ports, build):
+    if not ports: return None
+    service_ports = []
+    for port, host_bindings in ports.items():
+        if host_bindings:
+            for binding in host_bindings:
+                host_ip_str = f"{binding['HostIp']}:" if binding.get('HostIp') and binding['HostIp'] != '0.0.0.0' else ""
+                service_ports.append(f"{host_ip_str}{binding['HostPort']}:{port}")
+        else:
+            service_ports.append(str(port))
+    return service_ports
+
+def _volumes(mounts, build):
+    service_volumes = []
+    for mount in mounts or []:
+        source = mount.get('Source')
+        target = mount.get('Target') or mount.get('Destination') # Container inspect reports 'Destination'
+
+        if not source or not target:
+            logger.warning("Skipping mount with missing Source or Target for service '%s' (type %s)", build.service_name, mount.get('Type'))
+            continue
+
+        volume_str = f"{source}:{target}"
+        if not mount.get('RW', True):
+            volume_str += ":ro"
+
+        if mount.get('Type') == 'volume':
+            is_default_docker_volume = len(mount['Name']) == 64 and all(c in '0123456789abcdef' for c in mount['Name'])
+            if build.include_default_volumes or not is_default_docker_volume:
+                service_volumes.append(volume_str)
+                if mount['Name'] not in build.volumes and not os.path.exists(source):
+                    build.volumes[mount['Name']] = {'external': False if not is_default_docker_volume else True}
+            else:
+                logger.info("Skipping default Docker volume '%s' for service '%s'.", mount['Name'], build.service_name)
+        elif mount.get('Type') == 'bind':
+            service_volumes.append(volume_str)
+    return service_volumes or None
+
+def _is_default_bridge(snapshot):
+    try:
+        network = snapshot.get_network('bridge').attrs
+    except docker.errors.NotFound:
+        return False
+    return network.get('Driver') == 'bridge' and not network.get('Options') and not network.get('Internal') and network.get('Scope') == 'local'
+
+def _network_aliases(net_config, build):
+    """Aliases set on the container, minus the ones Docker adds itself (its short ID) and its own name."""
+    aliases = []
+    for alias in (net_config or {}).get('Aliases') or []:
+        if alias and alias != build.service_name and not build.container.id.startswith(alias) and alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+def _networks(networks, build):
+    if not networks: return None
+    service_networks = {}
+    for net_name, net_config in networks.items():
+        if net_name == 'bridge' and _is_default_bridge(build.snapshot): continue # Compose attaches the default network itself
+        aliases = _network_aliases(net_config, build)
+        service_networks[net_name] = {'aliases': aliases} if aliases else {}
+        if net_name not in build.networks:
+            try:
+                network_obj = build.snapshot.get_network(net_name)
+                if network_obj.attrs.get('Driver') != 'bridge':
+                    build.networks[net_name] = {'driver': network_obj.attrs.get('Driver')} if network_obj.attrs.get('Driver') else {}
+            except docker.errors.NotFound:
+                build.networks[net_name] = {}
+    return service_networks or None
+
+def _devices(devices, build):
+    if not devices: return None
+    return [f"{d['PathOnHost']}:{d['PathInContainer']}:{d['CgroupPermissions']}" for d in devices]
+
+def _restart(policy, build):
+    name = (policy or {}).get('Name')
+    return name if name and name != 'no' else None
+
+def _duration(nanoseconds):
+    """Docker's nanosecond durations as compose duration strings (30000000000 -> '30s')."""
+    for unit, size in (('h', 3600 * 10 ** 9), ('m', 60 * 10 ** 9), ('s', 10 ** 9), ('ms', 10 ** 6), ('us', 10 ** 3)):
+        if nanoseconds % size == 0: return f"{nanoseconds // size}{unit}"
+    return f"{nanoseconds}ns"
+
+def _healthcheck(healthcheck, build):
+    if not healthcheck or not healthcheck.get('Test'): return None
+    if healthcheck['Test'] == ['NONE']: return {'disable': True}
+    service_healthcheck = {'test': healthcheck['Test']}
+    for key, compose_key in (('Interval', 'interval'), ('Timeout', 'timeout'), ('StartPeriod', 'start_period'), ('StartInterval', 'start_interval')):
+        if healthcheck.get(key): service_healthcheck[compose_key] = _duration(healthcheck[key])
+    if healthcheck.get('Retries'): service_healthcheck['retries'] = healthcheck['Retries']
+    return service_healthcheck
+
+def _ulimits(ulimits, build):
+    if not ulimits: return None
+    return {u['Name']: u['Soft'] if u.get('Soft') == u.get('Hard') else {'soft': u.get('Soft'), 'hard': u.get('Hard')} for u in ulimits}
+
+def _logging(log_config, build):
+    if not log_config or not log_config.get('Type'): return None
+    if log_config['Type'] == 'json-file' and not log_config.get('Config'): return None # The daemon's default
+    service_logging = {'driver': log_config['Type']}
+    if log_config.get('Config'): service_logging['options'] = log_config['Config']
+    return service_logging
+
+def _cpus(nano_cpus, build):
+    if not nano_cpus: return None
+    cpus = nano_cpus / 10 ** 9
+    return int(cpus) if cpus.is_integer() else cpus
+
+def _tmpfs(tmpfs, build):
+    if not tmpfs: return None
+    return [f"{path}:{options}" if options else path for path, options in tmpfs.items()]
+
+def _positive(value, build): return value if value and value > 0 else None
+def _joined(value, build): return " ".join(value) if value else None
+def _flag(value, build): return True if value else None
+
+DEFAULT_SHM_SIZE = 64 * 1024 * 1024
+
+# compose key -> (inspect path, converter), in output order. Paths are (key,) or (section, key).
+# A converter takes the value at the path (None if missing) and the _ServiceBuild, and returns the
+# compose value or None to leave the key out. Without a converter, the value is copied when it is set.
+SERVICE_FIELDS = (
+    ('image', ('Image',), _image),
+    ('command', ('Config', 'Cmd'), _joined),
+    ('environment', ('Config', 'Env'), _environment),
+    ('ports', ('NetworkSettings', 'Ports'), _ports),
+    ('volumes', ('Mounts',), _volumes),
+    ('networks', ('NetworkSettings', 'Networks'), _networks),
+    ('restart', ('HostConfig', 'RestartPolicy'), _restart),
+    ('privileged', ('HostConfig', 'Privileged'), _flag),
+    ('user', ('Config', 'User'), None),
+    ('pid', ('HostConfig', 'PidMode'), None),
+    ('uts', ('HostConfig', 'UTSMode'), None),
+    ('working_dir', ('Config', 'WorkingDir'), None),
+    ('entrypoint', ('Config', 'Entrypoint'), _joined),
+    ('cap_add', ('HostConfig', 'CapAdd'), None),
+    ('cap_drop', ('HostConfig', 'CapDrop'), None),
+    ('devices', ('HostConfig', 'Devices'), _devices),
+    ('healthcheck', ('Config', 'Healthcheck'), _healthcheck),
+    ('ulimits', ('HostConfig', 'Ulimits'), _ulimits),
+    ('logging', ('HostConfig', 'LogConfig'), _logging),
+    ('mem_limit', ('HostConfig', 'Memory'), _positive),
+    ('mem_reservation', ('HostConfig', 'MemoryReservation'), _positive),
+    ('cpus', ('HostConfig', 'NanoCpus'), _cpus),
+    ('cpu_shares', ('HostConfig', 'CpuShares'), _positive),
+    ('cpuset', ('HostConfig', 'CpusetCpus'), None),
+    ('shm_size', ('HostConfig', 'ShmSize'), lambda size, build: size if size and size != DEFAULT_SHM_SIZE else None),
+    ('sysctls', ('HostConfig', 'Sysctls'), None),
+    ('extra_hosts', ('HostConfig', 'ExtraHosts'), None),
+    ('dns', ('HostConfig', 'Dns'), None),
+    ('dns_search', ('HostConfig', 'DnsSearch'), None),
+    ('tmpfs', ('HostConfig', 'Tmpfs'), _tmpfs),
+    ('labels', ('Config', 'Labels'), None),
+)
+
+def _getter(path):
+    """Compiles an inspect path into a function reading it; a missing or non-dict level gives None."""
+    head, rest = path[0], path[1:]
+    if not rest:
+        return lambda attrs: attrs.get(head)
+    inner = _getter(rest)
+    def get(attrs):
+        value = attrs.get(head)
+        return inner(value) if isinstance(value, dict) else None
+    return get
+
+# SERVICE_FIELDS compiled once: each inspect section (Config, HostConfig, ...) is looked up once per
+# container, and every field becomes (compose key, section index, key in section, converter).
+_SECTIONS = tuple(dict.fromkeys(path[0] for _, path, _ in SERVICE_FIELDS if len(path) == 2))
+_COMPILED_FIELDS = tuple((key, 0, path[0], convert) if len(path) == 1 else (key, _SECTIONS.index(path[0]) + 1, path[1], convert)
+                         for key, path, convert in SERVICE_FIELDS)
+
+def build_service(container, snapshot, include_all_env_vars, include_default_volumes):
+    """
+    Builds the compose service for one inspected container.
+    Returns (service_name, service, networks, volumes); service is None when no image could be
+    determined, networks/volumes are the top-level entries this service needs.
+    """
+    service_name = container.attrs['Name'].lstrip('/') or container.short_id
+    logger.debug("Processing service '%s' for container %s", service_name, container.short_id)
+    build = _ServiceBuild(container, snapshot, service_name, include_all_env_vars, include_default_volumes)
+    attrs = container.attrs
+    sections = [attrs] + [section if isinstance(section, dict) else {} for section in map(attrs.get, _SECTIONS)]
+    service = {}
+    for key, section, field, convert in _COMPILED_FIELDS:
+        value = sections[section].get(field)
+        if convert is None:
+            if value: service[key] = value
+        else:
+            value = convert(value, build)
+            if value is not None: service[key] = value
+
+    if not service.get('image'):
+        logger.warning("Service '%s' has no image. Not adding it to the compose file.", service_name)
+        return service_name, None, {}, {}
+    logger.debug("Built service '%s' with keys: %s", service_name, ", ".join(service))
+    return service_name, service, build.networks, build.volumes
 
-def generate_compose(client, containers_to_inspect, include_all_env_vars, include_default_volumes):
+def generate_compose(client, containers_to_inspect, include_all_env_vars, include_default_volumes, snapshot=None):
     """
     Generates docker-compose configuration for the specified containers.
+    Pass a ContainerSnapshot to reuse containers, images and networks that were already fetched.
     """
+    if snapshot is None:
+        snapshot = ContainerSnapshot(client)
     compose_data = {'version': '3.8', 'services': {}}
     networks_to_create = {}
     volumes_to_create = {}
-    sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Initializing. Containers to inspect: {containers_to_inspect}\n")
-
+    logger.debug("Generating compose for %d container(s)", len(containers_to_inspect))
 
     for container_name_or_id in containers_to_inspect:
-        sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Attempting to get container: {container_name_or_id}\n")
         try:
-            container = client.containers.get(container_name_or_id)
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Successfully got container object for: {container_name_or_id}\n")
+            container = snapshot.get_container(container_name_or_id)
         except docker.errors.NotFound:
-            sys.stderr.write(f"Warning: Container '{container_name_or_id}' not found. Skipping.\n")
+            logger.warning("Container '%s' not found. Skipping.", container_name_or_id)
             continue
         except docker.errors.APIError as e:
-            sys.stderr.write(f"Warning: Error getting container '{container_name_or_id}': {e}. Skipping.\n")
+            logger.warning("Error getting container '%s': %s. Skipping.", container_name_or_id, e)
             continue
 
-        service_name = container.attrs['Name'].lstrip('/') 
-        if not service_name: 
-            service_name = container.short_id 
-        sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Processing service_name: '{service_name}' for container ID: {container.id}\n")
-
-        service = {}
-        
-        # Image
-        try:
-            img_attrs = container.attrs.get('Image')
-            config_img = container.attrs.get('Config', {}).get('Image')
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Image Attrs='{img_attrs}', Config Image='{config_img}'\n")
-            if img_attrs:
-                img = client.images.get(img_attrs) # Use Image ID from attrs
-                if img.tags:
-                    service['image'] = img.tags[0]
-                    sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Using image from tags: {service['image']}\n")
-                elif config_img: # Fallback to image name from container's config if no tags
-                    service['image'] = config_img
-                    sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': No tags, using image from config: {service['image']}\n")
-                else: 
-                    sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Image object found but no tags and no config image name. This is unusual.\n")
-                    service['image'] = img_attrs 
-            elif config_img: 
-                 service['image'] = config_img
-                 sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Image ID from attrs missing, using image from config: {service['image']}\n")
-            else:
-                sys.stderr.write(f"Warning: Could not determine image for {service_name}. Both Image ID and Config.Image are missing.\n")
-
-        except docker.errors.ImageNotFound:
-            service['image'] = container.attrs.get('Config', {}).get('Image')
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Image ID not found, using image from config: {service['image']}\n")
-        except Exception as e:
-            sys.stderr.write(f"Warning: Could not determine image for {service_name}: {e}. Using config image name if available.\n")
-            service['image'] = container.attrs.get('Config', {}).get('Image', 'unknown_image_due_to_error')
-
-
-        # Command
-        if container.attrs['Config']['Cmd']:
-            service['command'] = " ".join(container.attrs['Config']['Cmd'])
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Command set to: {service['command']}\n")
-
-
-        # Environment Variables
-        excluded_keys_from_label = []
-        container_labels = container.attrs.get('Config', {}).get('Labels', {})
-        if container_labels and 'AUTOCOMPOSE_EXCLUDE' in container_labels:
-            exclude_str = container_labels.get('AUTOCOMPOSE_EXCLUDE', '')
-            if exclude_str:
-                excluded_keys_from_label = [key.strip() for key in exclude_str.split(',') if key.strip()]
-                sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}' - Parsed AUTOCOMPOSE_EXCLUDE label: {excluded_keys_from_label}\n")
-        else:
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}' - No AUTOCOMPOSE_EXCLUDE label found or it's empty.\n")
-
-
-        if container.attrs['Config']['Env']:
-            service['environment'] = {}
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}' - Processing ENV VARS...\n")
-            for env_var_str in container.attrs['Config']['Env']:
-                key, value = "", None 
-                has_value_assignment = "=" in env_var_str
-                if has_value_assignment:
-                    key, value = env_var_str.split("=", 1)
-                else:
-                    key = env_var_str 
-                
-                sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}' - ENV: Original='{env_var_str}', Parsed Key='{key}' (Type: {type(key)})\n")
-                sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}' - Excluded keys from label: {excluded_keys_from_label} (Type of items: {[type(ek) for ek in excluded_keys_from_label]})\n")
-
-                if not key: 
-                    continue
-
-                if key in excluded_keys_from_label:
-                    sys.stderr.write(f"Info: Excluding ENV VAR '{key}' for service '{service_name}' due to AUTOCOMPOSE_EXCLUDE label.\n")
-                    continue 
-
-                if include_all_env_vars: 
-                     service['environment'][key] = value
-                elif has_value_assignment: 
-                    service['environment'][key] = value
-            if not service.get('environment'): 
-                if 'environment' in service: del service['environment'] 
-            elif service.get('environment'): 
-                sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}' - Final ENV: {service['environment']}\n")
-            else: 
-                 if 'environment' in service: del service['environment']
-
-        
-        # Ports
-        if container.attrs['NetworkSettings']['Ports']:
-            service['ports'] = []
-            for port, host_bindings in container.attrs['NetworkSettings']['Ports'].items():
-                if host_bindings:
-                    for binding in host_bindings:
-                        host_ip_str = f"{binding['HostIp']}:" if binding.get('HostIp') and binding['HostIp'] != '0.0.0.0' else ""
-                        service['ports'].append(f"{host_ip_str}{binding['HostPort']}:{port}")
-                else: 
-                    service['ports'].append(str(port))
-            if service.get('ports'): 
-                 sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Ports: {service['ports']}\n")
-
-
-        # Volumes
-        service_volumes = []
-        if container.attrs['Mounts']:
-            for mount in container.attrs['Mounts']:
-                source = mount.get('Source') 
-                target = mount.get('Target') 
-
-                if not source or not target: 
-                    sys.stderr.write(f"Warning: Skipping mount with missing Source or Target for service '{service_name}': {mount}\n")
-                    continue
-
-                volume_str = f"{source}:{target}"
-                if not mount.get('RW', True): 
-                    volume_str += ":ro"
-
-                if mount.get('Type') == 'volume':
-                    is_default_docker_volume = len(mount['Name']) == 64 and all(c in '0123456789abcdef' for c in mount['Name'])
-                    if include_default_volumes or not is_default_docker_volume:
-                        service_volumes.append(volume_str)
-                        if mount['Name'] not in volumes_to_create and not os.path.exists(source):
-                            volumes_to_create[mount['Name']] = {'external': False if not is_default_docker_volume else True}
-                    else:
-                        sys.stderr.write(f"Info: Skipping default Docker volume '{mount['Name']}' for service '{service_name}'.\n")
-                elif mount.get('Type') == 'bind':
-                    service_volumes.append(volume_str)
-            if service_volumes:
-                service['volumes'] = service_volumes
-                sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Volumes: {service['volumes']}\n")
-
-
-        # Networks
-        if container.attrs['NetworkSettings']['Networks']:
-            service_networks = {} 
-            network_names = list(container.attrs['NetworkSettings']['Networks'].keys())
-            is_only_default_bridge = False
-            if len(network_names) == 1 and network_names[0] == 'bridge':
-                try:
-                    network_obj = client.networks.get('bridge')
-                    if network_obj.attrs.get('Driver') == 'bridge' and \
-                       not network_obj.attrs.get('Options') and \
-                       not network_obj.attrs.get('Internal') and \
-                       network_obj.attrs.get('Scope') == 'local':
-                        is_only_default_bridge = True
-                except docker.errors.NotFound:
-                    pass 
-            
-            if not is_only_default_bridge:
-                for net_name, net_config in container.attrs['NetworkSettings']['Networks'].items():
-                    if net_name == 'bridge':
-                        try:
-                            network_obj = client.networks.get('bridge')
-                            if network_obj.attrs.get('Driver') == 'bridge' and \
-                               not network_obj.attrs.get('Options') and \
-                               not network_obj.attrs.get('Internal') and \
-                               network_obj.attrs.get('Scope') == 'local':
-                                continue 
-                        except docker.errors.NotFound:
-                            pass 
-
-                    service_networks[net_name] = {} 
-                    if net_name not in networks_to_create:
-                        try:
-                            network_obj = client.networks.get(net_name)
-                            if network_obj.attrs.get('Driver') != 'bridge': 
-                                 networks_to_create[net_name] = {'driver': network_obj.attrs.get('Driver')} if network_obj.attrs.get('Driver') else {}
-                        except docker.errors.NotFound:
-                             networks_to_create[net_name] = {} 
-            if service_networks: 
-                service['networks'] = service_networks
-                sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Networks: {service['networks']}\n")
-
-
-        # Restart Policy
-        if container.attrs['HostConfig']['RestartPolicy'] and container.attrs['HostConfig']['RestartPolicy']['Name']:
-            policy = container.attrs['HostConfig']['RestartPolicy']['Name']
-            if policy != 'no': 
-                service['restart'] = policy
-        
-        if container.attrs['HostConfig'].get('Privileged'): service['privileged'] = True
-        if container.attrs['Config'].get('User'): service['user'] = container.attrs['Config']['User']
-        if container.attrs['HostConfig'].get('PidMode') and container.attrs['HostConfig']['PidMode'] != "": service['pid'] = container.attrs['HostConfig']['PidMode']
-        if container.attrs['HostConfig'].get('UTSMode') and container.attrs['HostConfig']['UTSMode'] != "": service['uts'] = container.attrs['HostConfig']['UTSMode']
-        if container.attrs['Config'].get('WorkingDir') and container.attrs['Config']['WorkingDir'] != "":
-            service['working_dir'] = container.attrs['Config']['WorkingDir']
-        if container.attrs['Config'].get('Entrypoint'):
-            service['entrypoint'] = " ".join(container.attrs['Config']['Entrypoint']) 
-        if container.attrs['HostConfig'].get('CapAdd'):
-            service['cap_add'] = container.attrs['HostConfig']['CapAdd']
-        if container.attrs['HostConfig'].get('CapDrop'):
-            service['cap_drop'] = container.attrs['HostConfig']['CapDrop']
-        if container.attrs['HostConfig'].get('Devices'):
-            service['devices'] = [f"{d['PathOnHost']}:{d['PathInContainer']}:{d['CgroupPermissions']}" for d in container.attrs['HostConfig']['Devices']]
-        
-        if container.attrs['Config'].get('Labels'):
-            service_labels = container.attrs['Config']['Labels'] # Get all labels
-            if service_labels: # If there are any labels
-                service['labels'] = service_labels # Add them all to the service
-                sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service '{service_name}': Labels added: {service['labels']}\n")
-        
-        if service and service.get('image'): 
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Final service dict for '{service_name}': {service}\n")
-            compose_data['services'][service_name] = service
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Assigned service '{service_name}' to compose_data.\n")
-        else:
-            sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Service dict for '{service_name}' was empty or missing image. Not adding to compose_data.\n")
-
+        service_name, service, networks, volumes = build_service(container, snapshot, include_all_env_vars, include_default_volumes)
+        if service is None: continue
+        compose_data['services'][service_name] = service
+        for name, config in networks.items(): networks_to_create.setdefault(name, config)
+        for name, config in volumes.items(): volumes_to_create.setdefault(name, config)
 
     if networks_to_create:
         compose_data['networks'] = networks_to_create
     if volumes_to_create:
         compose_data['volumes'] = volumes_to_create
-    
-    sys.stderr.write(f"[DEBUG AUTOCOMPOSE] Final compose_data before return: {compose_data}\n")
+    logger.debug("Generated %d service(s), %d network(s), %d volume(s)", len(compose_data['services']), len(networks_to_create), len(volumes_to_create))
     return compose_data
 
+# Inspect fields build_service() reads; a container's fingerprint covers exactly these. Networks are
+# fingerprinted by name and aliases in container_fingerprint(), since their IP addresses change on every restart.
+FINGERPRINT_FIELDS = (('Name',), ('Config', 'Image')) + tuple(path for _, path, _ in SERVICE_FIELDS if path != ('NetworkSettings', 'Networks'))
+
+_FINGERPRINT_GETTERS = tuple(_getter(path) for path in FINGERPRINT_FIELDS)
+
+def container_fingerprint(container, snapshot, include_all_env_vars, include_default_volumes):
+    """
+    sha256 over everything build_service() output depends on: the inspect fields it reads,
+    the image tags, network settings and aliases it looks up, and the generation options.
+    Returns None when a lookup fails, so the service is always rebuilt.
+    """
+    attrs = container.attrs
+    try:
+        try: image_tags = snapshot.get_image(attrs['Image']).tags if attrs.get('Image') else None
+        except docker.errors.ImageNotFound: image_tags = None
+        networks = {}
+        container_networks = attrs['NetworkSettings']['Networks'] or {}
+        for net_name in list(container_networks) + ['bridge']:
+            aliases = (container_networks.get(net_name) or {}).get('Aliases')
+            try:
+                net_attrs = snapshot.get_network(net_name).attrs
+                networks[net_name] = [net_attrs.get(k) for k in ('Driver', 'Options', 'Internal', 'Scope')] + [aliases]
+            except docker.errors.NotFound:
+                networks[net_name] = [aliases]
+    except Exception as e:
+        logger.debug("No fingerprint for container %s: %s", container.short_id, e)
+        return None
+    payload = {
+        'fields': [get(attrs) for get in _FINGERPRINT_GETTERS],
+        'short_id': container.short_id,
+        'networks': networks,
+        'image_tags': image_tags,
+        'volume_sources_exist': [os.path.exists(m['Source']) for m in attrs.get('Mounts') or [] if m.get('Type') == 'volume' and m.get('Source')],
+        'options': [bool(include_all_env_vars), bool(include_default_volumes)],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def render_compose(client, containers_to_inspect, include_all_env_vars, include_default_volumes, snapshot=None, fragment_cache=None, stream=None):
+    """
+    Like dump_compose(generate_compose(...)), but content-addressed: each service's YAML
+    fragment is cached by its container fingerprint, and only services whose fingerprint
+    changed are rebuilt and re-serialized.
+
+    fragment_cache is any MetadataCache-like object (get/put). Returns (yaml_text, changes),
+    where changes lists (service_name, status) with status 'new', 'changed' or 'unchanged'
+    relative to the last time that service was rendered with this cache.
+    With a stream, each service is written to it as soon as it is rendered and yaml_text is None.
+    """
+    if snapshot is None:
+        snapshot = ContainerSnapshot(client)
+    out = io.StringIO() if stream is None else stream
+    out.write(dump_compose({'version': '3.8'}))
+    written = set()
+    networks_to_create = {}
+    volumes_to_create = {}
+    changes = []
+    for container_name_or_id in containers_to_inspect:
+        try:
+            container = snapshot.get_container(container_name_or_id)
+        except docker.errors.NotFound:
+            logger.warning("Container '%s' not found. Skipping.", container_name_or_id)
+            continue
+        except docker.errors.APIError as e:
+            logger.warning("Error getting container '%s': %s. Skipping.", container_name_or_id, e)
+            continue
+
+        fingerprint = container_fingerprint(container, snapshot, include_all_env_vars, include_default_volumes)
+        entry = fragment_cache.get(('fragment', fingerprint)) if fragment_cache is not None and fingerprint else None
+        if entry is None:
+            service_name, service, networks, volumes = build_service(container, snapshot, include_all_env_vars, include_default_volumes)
+            if service is None: continue
+            text = dump_compose({'services': {service_name: service}}).split('\n', 1)[1] # Drop the "services:" line
+            entry = (service_name, text, networks, volumes)
+            if fragment_cache is not None and fingerprint: fragment_cache.put(('fragment', fingerprint), entry)
+        service_name, text, networks, volumes = entry
+        if fragment_cache is not None:
+            service_key = ('service', service_name, bool(include_all_env_vars), bool(include_default_volumes))
+            previous = fragment_cache.get(service_key)
+            status = 'new' if previous is None else ('unchanged' if previous == fingerprint and fingerprint else 'changed')
+            fragment_cache.put(service_key, fingerprint)
+        else:
+            status = 'new'
+        changes.append((service_name, status))
+        if service_name not in written: # The same container listed twice renders the same service
+            if not written: out.write("services:\n")
+            out.write(text)
+            written.add(service_name)
+        for name, config in networks.items(): networks_to_create.setdefault(name, config)
+        for name, config in volumes.items(): volumes_to_create.setdefault(name, config)
+
+    if not written:
+        out.write(dump_compose({'services': {}}))
+    else:
+        if networks_to_create: out.write(dump_compose({'networks': networks_to_create}))
+        if volumes_to_create: out.write(dump_compose({'volumes': volumes_to_create}))
+    logger.debug("Rendered %d service(s), %d rebuilt", len(written), sum(1 for _, status in changes if status != 'unchanged'))
+    return (out.getvalue() if stream is None else None), changes
+
+if pyaml is not None:
+    class MyDumper(pyaml.Dumper):
+        def increase_indent(self, flow=False, indentless=False):
+            return super(MyDumper, self).increase_indent(flow, False)
+
+# libyaml's emitter, when PyYAML was built with it. It always writes block sequences inside
+# mappings unindented, so its output is re-indented to match MyDumper (see _indent_sequences).
+CDumper = getattr(pyaml, 'CDumper', None) if getattr(pyaml, '__name__', None) == 'yaml' else None
+
+_C_SAFE_LINE_WIDTH = 72 # Below the emitters' 80-column wrap, with room for the added indentation
+
+def _single_line_scalars(value, column=0):
+    """
+    True if every scalar in value is printable ASCII that neither emitter would wrap or
+    break across lines. Only then is the C output plus re-indenting byte-identical to MyDumper's.
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if not _single_line_scalars(key, column): return False
+            if isinstance(item, str) and ' ' in item and column + len(str(key)) + len(item) + 4 > _C_SAFE_LINE_WIDTH: return False
+            if not _single_line_scalars(item, column + 4): return False
+        return True
+    if isinstance(value, list):
+        return all(_single_line_scalars(item, column + 4) for item in value)
+    if isinstance(value, str):
+        if len(value) > 120 or not (value.isascii() and value.isprintable()): return False
+        return ' ' not in value or column + len(value) + 4 <= _C_SAFE_LINE_WIDTH
+    return value is None or isinstance(value, (bool, int, float))
+
+def _indent_sequences(text):
+    """Turns block sequences that sit at their parent key's column ("key:\n- a") into indented ones ("key:\n  - a")."""
+    lines = []
+    open_columns = [] # Columns of the unindented sequences the current line is inside
+    key_column = None # Column of the key when the previous line opened a block ("key:")
+    for line in text.split('\n'):
+        content = line.lstrip(' ')
+        if not content:
+            lines.append(line)
+            continue
+        column = len(line) - len(content)
+        while open_columns and (column < open_columns[-1] or (column == open_columns[-1] and not content.startswith('- '))):
+            open_columns.pop()
+        if column == key_column and content.startswith('- ') and (not open_columns or open_columns[-1] != column):
+            open_columns.append(column)
+        lines.append(' ' * (column + 2 * len(open_columns)) + content if open_columns else line)
+        key_column = None
+        if content.endswith(':'):
+            key_column = column
+            while content.startswith('- '):
+                content = content[2:]
+                key_column += 2
+    return '\n'.join(lines)
+
+def dump_compose(compose_data, stream=None):
+    """
+    Serializes compose data as YAML. Writes to stream if given, otherwise returns a string.
+    Uses libyaml's C emitter when it is available and the output would be identical.
+    """
+    if pyaml is None:
+        raise ImportError("Unable to import a YAML library. Please install pyyaml, ruamel.yaml, or pyaml.")
+    with metrics.phase('yaml_dump'):
+        if CDumper is not None and _single_line_scalars(compose_data):
+            text = _indent_sequences(pyaml.dump(compose_data, Dumper=CDumper, default_flow_style=False, sort_keys=False))
+            if stream is None: return text
+            stream.write(text)
+            return None
+        return pyaml.dump(compose_data, stream, Dumper=MyDumper, default_flow_style=False, sort_keys=False)
+
 def main():
     parser = argparse.ArgumentParser(description="Generate a docker-compose.yml from running Docker container(s).")
     parser.add_argument("containers", metavar="CONTAINER", nargs='+', help="Name or ID of one or more containers to inspect.")
@@ -273,27 +502,46 @@ def main():
         action="store_true",
         help="Include default Docker-created volumes (often long hex names) in the output."
     )
+    parser.add_argument(
+        "--host", "-H",
+        dest="docker_host",
+        help="Docker daemon to connect to (unix://, tcp:// or ssh:// URL). Defaults to DOCKER_HOST or the local socket."
+    )
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument(
+        "--verbose", "-v",
+        action="count",
+        default=0,
+        help="Log more detail to stderr (-v for info, -vv for debug)."
+    )
+    verbosity.add_argument(
+        "--quiet", "-q",
+        action="store_true",
+        help="Only log errors to stderr."
+    )
     args = parser.parse_args()
 
+    level = logging.ERROR if args.quiet else (logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)]
+    logging.basicConfig(stream=sys.stderr, level=level, format="%(levelname)s: %(message)s")
+
+    if pyaml is None:
+        sys.stderr.write("Unable to import a YAML library. Please install pyyaml, ruamel.yaml, or pyaml.\n")
+        sys.exit(1)
+
     try:
-        client = docker.from_env()
+        client = docker.DockerClient(base_url=args.docker_host) if args.docker_host else docker.from_env()
         client.ping()
     except Exception as e:
         sys.stderr.write(f"Error: Could not connect to Docker daemon. Is it running and accessible?\n{e}\n")
         sys.exit(1)
 
-    compose_config = generate_compose(
-        client, 
-        args.containers, 
-        args.include_all_env_vars, 
-        args.include_default_volumes
+    render_compose( # Writes each service as soon as it is rendered
+        client,
+        args.containers,
+        args.include_all_env_vars,
+        args.include_default_volumes,
+        stream=sys.stdout
     )
-    
-    class MyDumper(pyaml.Dumper):
-        def increase_indent(self, flow=False, indentless=False):
-            return super(MyDumper, self).increase_indent(flow, False)
-
-    pyaml.dump(compose_config, sys.stdout, Dumper=MyDumper, default_flow_style=False, sort_keys=False)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,153 @@
+"""
+Times the listing and generation hot paths against a fake Docker daemon.
+
+    python benchmarks/bench_hot_paths.py [--sizes 10,100,1000] [--repeat 10] [--latency-ms 1] [--warm] [--live-inventory] [--json]
+
+For each container count it reports p50/p99 latency and Docker API calls per run of:
+the index page, one /api/containers page, autocompose.generate_compose, run_autocompose_script,
+stack vs individuals vs per-compose-project generation, and a ZIP download of the generated files.
+Caches are cleared before every run unless --warm is given, so N+1 API patterns show up
+in the call counts.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_docker import FakeDockerEngine
+from bench_stats import percentile
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark docker-autocompose-gui hot paths against a fake Docker daemon.")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated container counts (default: 10,100,1000)")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per operation and size (default: 10)")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Latency the fake daemon adds to every API call (default: 1)")
+    parser.add_argument("--warm", action="store_true", help="Keep metadata and fragment caches between runs")
+    parser.add_argument("--live-inventory", action="store_true", help="Serve listings from the live inventory (ENABLE_LIVE_INVENTORY=true)")
+    parser.add_argument("--only", default="", help="Comma-separated operation names to run")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    engine = FakeDockerEngine(containers=sizes[0], latency_seconds=args.latency_ms / 1000).start()
+
+    workdir = tempfile.mkdtemp(prefix="autocompose-bench-")
+    os.chdir(workdir) # The app keeps its temp files under ./compose_temp
+    os.environ.update({
+        'DOCKER_HOST': engine.url, 'DOCKER_HOSTS': '',
+        'OUTPUT_DIR': os.path.join(workdir, "output"), 'JOB_STATE_DIR': os.path.join(workdir, "jobs"),
+        'ENABLE_LIVE_INVENTORY': 'true' if args.live_inventory else 'false',
+        'SNAPSHOT_INTERVAL_MINUTES': '0', 'DOCKER_HEALTH_INTERVAL': '3600',
+    })
+    logging.basicConfig(level=logging.WARNING) # Takes precedence over the app's INFO-level basicConfig
+    import app as webapp
+    import autocompose
+    from inventory import ContainerSnapshot
+
+    client = webapp.get_docker_client()
+    http = webapp.app.test_client()
+    host = webapp.DEFAULT_HOST
+
+    def clear_caches():
+        if not args.warm:
+            host.metadata_cache.clear()
+            host.fragment_cache.clear()
+
+    def selection():
+        return {host.container_key(c['Id']): c['Names'][0].lstrip('/') for c in client.api.containers()}
+
+    def generate(action):
+        def run():
+            snapshots, _ = webapp.host_snapshots([host.name], timeout=None)
+            outcome = webapp.generate_batch(action, selected, snapshots)
+            webapp.ARTIFACT_STORE.delete_batch(outcome['batch_id'])
+        return run
+
+    def run_generate_projects():
+        projects, snapshot = host.list_projects(ready_timeout=None) # One listing gives the project index and the snapshot
+        outcome = webapp.generate_batch("generate_projects", {}, {host.name: snapshot}, projects={host.name: projects})
+        webapp.ARTIFACT_STORE.delete_batch(outcome['batch_id'])
+
+    def run_index():
+        assert http.get('/').status_code == 200
+
+    def run_containers_page():
+        assert http.get('/api/containers?limit=100').status_code == 200
+
+    def run_generate_compose():
+        autocompose.generate_compose(client, ids, False, False)
+
+    def run_autocompose_script():
+        snapshot = ContainerSnapshot.from_running(client, cache=host.metadata_cache)
+        _, error, rc = webapp.run_autocompose_script(ids, snapshot=snapshot)
+        assert rc == 0, error
+
+    def run_zip():
+        response = http.get(f'/download_saved_zip/{zip_subdir}')
+        assert response.status_code == 200 and len(response.data) > 0
+
+    operations = [
+        ("index", run_index),
+        ("api_containers", run_containers_page),
+        ("generate_compose", run_generate_compose),
+        ("run_autocompose_script", run_autocompose_script),
+        ("generate_stack", generate("generate_stack")),
+        ("generate_individuals", generate("generate_individuals")),
+        ("generate_projects", run_generate_projects),
+        ("zip_download", run_zip),
+    ]
+    only = {name.strip() for name in args.only.split(",") if name.strip()}
+    operations = [(name, fn) for name, fn in operations if not only or name in only]
+
+    results = []
+    for size in sizes:
+        engine.set_containers(size)
+        if args.live_inventory: # The fake daemon sends no events, so pull in the new state directly
+            host.inventory.wait_ready(timeout=30)
+            host.inventory._resync(client)
+        clear_caches()
+        selected = selection()
+        ids = [key.rpartition('/')[2] for key in selected]
+        snapshots, _ = webapp.host_snapshots([host.name], timeout=None)
+        outcome = webapp.generate_batch("generate_individuals", selected, snapshots, output_subdir_name=f"bench_{size}")
+        webapp.save_batch_to_volume(webapp.ARTIFACT_STORE.load_batch(outcome['batch_id']))
+        webapp.ARTIFACT_STORE.delete_batch(outcome['batch_id'])
+        zip_subdir = f"bench_{size}"
+
+        for name, fn in operations:
+            fn() # Warm-up: imports, connection pool, template compilation
+            durations, calls = [], None
+            for _ in range(args.repeat):
+                clear_caches()
+                engine.reset_calls()
+                started = time.perf_counter()
+                fn()
+                durations.append((time.perf_counter() - started) * 1000)
+                run_calls = engine.snapshot_calls()
+                calls = run_calls if calls is None else calls + run_calls
+            calls = {endpoint: count / args.repeat for endpoint, count in sorted(calls.items())}
+            results.append({
+                'containers': size, 'operation': name,
+                'p50_ms': round(percentile(durations, 50), 2), 'p99_ms': round(percentile(durations, 99), 2),
+                'api_calls': round(sum(calls.values()), 1), 'api_calls_by_endpoint': calls,
+            })
+            if not args.json:
+                breakdown = ", ".join(f"{endpoint}={count:g}" for endpoint, count in calls.items())
+                print(f"{size:>6} {name:<24} p50 {results[-1]['p50_ms']:>9.2f} ms   p99 {results[-1]['p99_ms']:>9.2f} ms   "
+                      f"api {results[-1]['api_calls']:>7g}  ({breakdown})", flush=True)
+
+    if args.json:
+        print(json.dumps({'latency_ms': args.latency_ms, 'repeat': args.repeat, 'warm': args.warm,
+                          'live_inventory': args.live_inventory, 'results': results}, indent=2))
+    engine.stop()
+
+if __name__ == "__main__":
+    main()
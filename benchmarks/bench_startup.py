@@ -0,0 +1,64 @@
+"""
+Measures worker boot time: how long a fresh interpreter takes to import app.py and answer
+its first request, as a gunicorn worker does after every --max-requests restart.
+
+    python benchmarks/bench_startup.py [--repeat 15]
+
+Runs each scenario in fresh subprocesses (GitHub upload off and on) and reports p50/p99 of
+the app import, the first request (which runs the one-time startup hook), and the whole
+process including interpreter startup.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from bench_stats import percentile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child process; prints its own timings as JSON
+CHILD = """
+import sys, time, json, logging
+logging.basicConfig(level=logging.WARNING)
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/metrics')
+first_request = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'first_request_ms': (first_request - imported) * 1000,
+                  'github_loaded': 'github' in sys.modules}))
+"""
+
+def run_child(env, workdir):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=workdir, env=env, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app.py import and first-request time.")
+    parser.add_argument("--repeat", type=int, default=15, help="Fresh processes per scenario (default: 15)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="autocompose-startup-bench-")
+    base_env = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE="0",
+                    OUTPUT_DIR=os.path.join(workdir, "output"), JOB_STATE_DIR=os.path.join(workdir, "jobs"),
+                    DOCKER_HOST="tcp://127.0.0.1:9", ENABLE_LIVE_INVENTORY="false") # Nothing listens there; startup must not need Docker
+    scenarios = [
+        ("github upload off", dict(base_env, ENABLE_GITHUB_UPLOAD="false")),
+        ("github upload on", dict(base_env, ENABLE_GITHUB_UPLOAD="true")),
+    ]
+    run_child(base_env, workdir) # Warm the bytecode and OS file caches
+    for name, env in scenarios:
+        runs = [run_child(env, workdir) for _ in range(args.repeat)]
+        line = "  ".join(f"{key[:-3]} p50 {percentile([r[key] for r in runs], 50):>7.1f} ms p99 {percentile([r[key] for r in runs], 99):>7.1f} ms"
+                         for key in ("import_ms", "first_request_ms", "process_ms"))
+        print(f"{name:<18} {line}  (PyGithub loaded: {runs[-1]['github_loaded']})", flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# Summary statistics shared by the benchmark scripts.
+
+import math
+
+def percentile(samples, pct):
+    """Nearest-rank percentile (pct in 0-100) of a non-empty list of samples."""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))]
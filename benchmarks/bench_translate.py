@@ -0,0 +1,75 @@
+"""
+Measures inspect-to-compose translation throughput.
+
+    python benchmarks/bench_translate.py [--services 1000] [--repeat 20]
+
+Runs autocompose.build_service() over synthetic container inspect payloads, with images and
+networks already cached, so only the per-container field mapping is timed. The "minimal"
+payloads carry the fields the fake Docker daemon serves; "full" payloads also set a
+healthcheck, ulimits, logging, resource limits, sysctls, extra hosts, DNS, tmpfs and a long
+environment with an AUTOCOMPOSE_EXCLUDE label.
+"""
+
+import os
+import sys
+import copy
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import docker
+from docker.models.containers import Container
+import autocompose
+from inventory import ContainerSnapshot, MetadataCache
+from fake_docker import FakeDockerEngine, container_inspect
+from bench_stats import percentile
+
+def full_inspect(attrs, i):
+    """Adds the optional fields build_service() translates to one fake container's inspect JSON."""
+    attrs = copy.deepcopy(attrs)
+    env_keys = [f"VAR_{n}" for n in range(40)]
+    attrs['Config']['Env'] += [f"{key}=value{n}" for n, key in enumerate(env_keys)]
+    attrs['Config']['Labels']['AUTOCOMPOSE_EXCLUDE'] = ",".join(env_keys[::4])
+    attrs['Config']['Healthcheck'] = {'Test': ['CMD', 'curl', '-f', f"http://localhost:{8000 + i}/health"],
+                                      'Interval': 30 * 10 ** 9, 'Timeout': 5 * 10 ** 9, 'StartPeriod': 10 * 10 ** 9, 'Retries': 3}
+    attrs['HostConfig'].update({
+        'Ulimits': [{'Name': 'nofile', 'Soft': 65536, 'Hard': 65536}, {'Name': 'nproc', 'Soft': 4096, 'Hard': 8192}],
+        'LogConfig': {'Type': 'json-file', 'Config': {'max-size': '10m', 'max-file': '3'}},
+        'Memory': 512 * 1024 * 1024, 'MemoryReservation': 256 * 1024 * 1024, 'NanoCpus': 1500000000, 'CpuShares': 512,
+        'ShmSize': 256 * 1024 * 1024, 'Sysctls': {'net.core.somaxconn': '1024'},
+        'ExtraHosts': [f"db{i}:10.1.0.{i % 250 + 2}"], 'Dns': ['1.1.1.1', '9.9.9.9'], 'DnsSearch': ['bench.local'],
+        'Tmpfs': {'/run': '', '/tmp': 'rw,size=64m'},
+    })
+    return attrs
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-service compose translation.")
+    parser.add_argument("--services", type=int, default=1000, help="Number of containers (default: 1000)")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed passes over all containers (default: 20)")
+    args = parser.parse_args()
+
+    with FakeDockerEngine(containers=args.services) as engine:
+        client = docker.DockerClient(base_url=engine.url)
+        image_count = max(1, min(args.services // 10, 50))
+        network_names = [f"benchnet{n}" for n in range(3)]
+        payloads = [container_inspect(i, image_count, network_names) for i in range(args.services)]
+        cache = MetadataCache(maxsize=None, ttl=None)
+        for name, attrs_list in (("minimal", payloads), ("full", [full_inspect(attrs, i) for i, attrs in enumerate(payloads)])):
+            containers = [Container(attrs=attrs, client=client) for attrs in attrs_list]
+            snapshot = ContainerSnapshot(client, containers, cache=cache)
+            for container in containers: # Warm-up: fetches images and networks once
+                autocompose.build_service(container, snapshot, False, False)
+            durations = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                for container in containers:
+                    autocompose.build_service(container, snapshot, False, False)
+                durations.append(time.perf_counter() - started)
+            p50, p99 = percentile(durations, 50), percentile(durations, 99)
+            print(f"{args.services:>6} services  {name:<8} p50 {p50 * 1000:>8.1f} ms/pass   p99 {p99 * 1000:>8.1f} ms/pass   "
+                  f"{p50 / args.services * 10 ** 6:>6.1f} us/service   {args.services / p50:>9.0f} services/s", flush=True)
+        client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compares YAML emission paths on a large stack.
+
+    python benchmarks/bench_yaml.py [--services 1000] [--repeat 5]
+
+Times dump_compose() on a whole-stack dict with the pure-Python emitter and with libyaml's
+C emitter, then render_compose() for a whole host (containers served by the fake Docker
+daemon, already fetched) returning one string vs streaming each service to a file,
+with the peak memory each one allocated.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import docker
+import autocompose
+from inventory import ContainerSnapshot, MetadataCache
+from fake_docker import FakeDockerEngine
+from bench_stats import percentile
+
+def measure(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return percentile(durations, 50), percentile(durations, 99), peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YAML emission for a large compose stack.")
+    parser.add_argument("--services", type=int, default=1000, help="Number of services (default: 1000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per variant (default: 5)")
+    args = parser.parse_args()
+
+    c_dumper = autocompose.CDumper
+    print(f"libyaml C emitter available: {c_dumper is not None}")
+    with FakeDockerEngine(containers=args.services) as engine:
+        client = docker.DockerClient(base_url=engine.url)
+        snapshot = ContainerSnapshot.from_running(client, cache=MetadataCache(maxsize=None, ttl=None))
+        ids = [container.id for container in snapshot.containers]
+        compose_data = autocompose.generate_compose(client, ids, False, False, snapshot=snapshot) # Fills the snapshot's image/network caches
+        output_path = os.path.join(tempfile.mkdtemp(prefix="autocompose-yaml-bench-"), "docker_stack.yml")
+
+        def use_c(enabled):
+            autocompose.CDumper = c_dumper if enabled else None
+
+        def render_to_file():
+            with open(output_path, "w", encoding="utf-8") as f:
+                autocompose.render_compose(client, ids, False, False, snapshot=snapshot, stream=f)
+
+        variants = [
+            ("dump_compose, pure Python", False, lambda: autocompose.dump_compose(compose_data)),
+            ("dump_compose, libyaml", True, lambda: autocompose.dump_compose(compose_data)),
+            ("render_compose -> str, pure Python", False, lambda: autocompose.render_compose(client, ids, False, False, snapshot=snapshot)),
+            ("render_compose -> str, libyaml", True, lambda: autocompose.render_compose(client, ids, False, False, snapshot=snapshot)),
+            ("render_compose -> file, libyaml", True, render_to_file),
+        ]
+        reference = None
+        for name, enabled, fn in variants:
+            if enabled and c_dumper is None: continue
+            use_c(enabled)
+            p50, p99, peak = measure(fn, args.repeat)
+            print(f"{args.services:>6} services  {name:<36} p50 {p50:>9.1f} ms   p99 {p99:>9.1f} ms   peak {peak / 1024 / 1024:>7.1f} MiB", flush=True)
+            text = autocompose.dump_compose(compose_data)
+            if reference is None: reference = text
+            elif text != reference: print("  output differs from the pure-Python emitter!")
+        use_c(True)
+        client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Checks that the libyaml fast path writes byte-for-byte the same YAML as the pure-Python emitter.
+
+    python benchmarks/check_yaml_equivalence.py [--cases 2000] [--services 200] [--seed 1]
+
+dump_compose() is compared on randomly generated compose-like documents full of awkward
+scalars (long spaced strings, YAML keywords, quotes, colons, newlines, non-ASCII text, nested
+and empty sequences). render_compose() is compared on containers with randomly mutated inspect
+data (images and networks served by the fake Docker daemon): returning a string, streaming to an
+in-memory buffer and to a file on disk, and with a fragment cache, both cold and warm. The
+pure-Python string render is the reference for every path. Exits 1 on the first mismatch.
+"""
+
+import os
+import io
+import sys
+import copy
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import docker
+from docker.models.containers import Container
+import autocompose
+from inventory import ContainerSnapshot, MetadataCache
+from fake_docker import FakeDockerEngine, container_inspect
+from bench_translate import full_inspect
+
+# Printable ASCII that still needs quoting or escaping; libyaml is used for documents made only of these
+SAFE_WORDS = ["web", "db", "yes", "no", "on", "off", "null", "~", "true", "0755", "1e3", "0x1F", "-", "- a", "a: b", "#tag",
+              "*ref", "&anchor", "!tag", "%x", "@at", "`tick`", "it's", 'say "hi"', "back\\slash", "", " lead", "trail ",
+              "--flag=value", "http://host:8080/path?q=1", "{a}", "[b]", "a,b"]
+# Ones that send the whole document to the pure-Python emitter
+UNSAFE_WORDS = ["tab\there", "ünïcödé", "日本語", "emoji 🐳", "line\nbreak"]
+
+def random_scalar(rng, safe):
+    kind = rng.random()
+    if kind < 0.1: return rng.randint(-10 ** 6, 10 ** 12)
+    if kind < 0.15: return rng.choice([True, False, None, 0.5, 1e-9])
+    words = SAFE_WORDS if safe else SAFE_WORDS + UNSAFE_WORDS
+    return rng.choice([" ", "", "_", ", "]).join(rng.choice(words) for _ in range(rng.choice([1, 1, 2, 3] if safe else [1, 5, 12, 30])))
+
+def random_value(rng, safe, depth=0):
+    kind = rng.random()
+    if depth > 3 or kind < 0.4: return random_scalar(rng, safe)
+    if kind < 0.7: return [random_value(rng, safe, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f"k{rng.randint(0, 99)}_{rng.choice(SAFE_WORDS)[:6]}": random_value(rng, safe, depth + 1) for _ in range(rng.randint(0, 4))}
+
+def random_compose(rng):
+    safe = rng.random() < 0.8
+    services = {f"svc{n}": {key: random_value(rng, safe, 1) for key in rng.sample(["image", "command", "environment", "labels", "ports",
+                                                                                    "volumes", "networks", "extra_hosts", "healthcheck"], 4)}
+                for n in range(rng.randint(1, 3))}
+    return {'version': '3.8', 'services': services, 'networks': {'net': {'external': rng.random() < 0.5}}}
+
+def mutate_inspect(attrs, rng):
+    """Puts awkward values where build_service() copies them straight into the output."""
+    attrs = copy.deepcopy(attrs)
+    safe = rng.random() < 0.8
+    attrs['Config']['Env'] += [f"FUZZ_{n}={random_scalar(rng, safe)}" for n in range(rng.randint(0, 6))]
+    attrs['Config']['Labels'].update({f"fuzz.{n}": str(random_scalar(rng, safe)) for n in range(rng.randint(0, 4))})
+    if rng.random() < 0.5: attrs['Config']['Cmd'] = [str(random_scalar(rng, safe)) for _ in range(rng.randint(1, 5))]
+    if rng.random() < 0.3: attrs['Config']['WorkingDir'] = str(random_scalar(rng, safe))
+    return attrs
+
+def check(name, expected, actual, context):
+    if actual == expected: return
+    print(f"MISMATCH in {name}: {context}")
+    for n, (a, b) in enumerate(zip(expected.splitlines(), actual.splitlines())):
+        if a != b:
+            print(f"  line {n + 1}\n    python: {a!r}\n    libyaml: {b!r}")
+            break
+    else:
+        print(f"  lengths differ: {len(expected)} vs {len(actual)}")
+    sys.exit(1)
+
+def check_dump(cases, rng):
+    c_dumper = autocompose.CDumper
+    fast = 0
+    for case in range(cases):
+        data = random_compose(rng)
+        fast += autocompose._single_line_scalars(data)
+        autocompose.CDumper = None
+        expected = autocompose.dump_compose(data)
+        autocompose.CDumper = c_dumper
+        check("dump_compose -> str", expected, autocompose.dump_compose(data), f"case {case}: {data!r}")
+        stream = io.StringIO()
+        autocompose.dump_compose(data, stream=stream)
+        check("dump_compose -> stream", expected, stream.getvalue(), f"case {case}: {data!r}")
+    print(f"dump_compose: {cases} random documents identical ({fast} eligible for libyaml)")
+
+def check_render(services, rng):
+    c_dumper = autocompose.CDumper
+    with FakeDockerEngine(containers=services) as engine:
+        client = docker.DockerClient(base_url=engine.url)
+        image_count = max(1, min(services // 10, 50))
+        network_names = [f"benchnet{n}" for n in range(3)]
+        payloads = [container_inspect(i, image_count, network_names) for i in range(services)]
+        payloads = [mutate_inspect(full_inspect(attrs, i) if i % 2 else attrs, rng) for i, attrs in enumerate(payloads)]
+        snapshot = ContainerSnapshot(client, [Container(attrs=attrs, client=client) for attrs in payloads],
+                                     cache=MetadataCache(maxsize=None, ttl=None))
+        ids = [attrs['Id'] for attrs in payloads]
+        output_path = os.path.join(tempfile.mkdtemp(prefix="autocompose-yaml-check-"), "docker_stack.yml")
+
+        def render(stream=None, fragment_cache=None):
+            return autocompose.render_compose(client, ids, False, False, snapshot=snapshot, fragment_cache=fragment_cache, stream=stream)[0]
+
+        def render_to_buffer(fragment_cache=None):
+            buffer = io.StringIO()
+            render(stream=buffer, fragment_cache=fragment_cache)
+            return buffer.getvalue()
+
+        def render_to_file(fragment_cache=None):
+            with open(output_path, "w", encoding="utf-8") as f:
+                render(stream=f, fragment_cache=fragment_cache)
+            with open(output_path, encoding="utf-8") as f:
+                return f.read()
+
+        autocompose.CDumper = None
+        expected = render()
+        check("pure Python render_compose -> stream", expected, render_to_buffer(), "stream vs str")
+        if c_dumper is None:
+            print("libyaml C emitter not available; only the pure-Python paths were compared")
+            client.close()
+            return
+        autocompose.CDumper = c_dumper
+        check("render_compose -> str", expected, render(), "no fragment cache")
+        check("render_compose -> stream", expected, render_to_buffer(), "no fragment cache")
+        check("render_compose -> file", expected, render_to_file(), "no fragment cache")
+        fragment_cache = MetadataCache(maxsize=None, ttl=None)
+        check("render_compose -> file", expected, render_to_file(fragment_cache), "cold fragment cache")
+        check("render_compose -> stream", expected, render_to_buffer(fragment_cache), "warm fragment cache")
+        check("render_compose -> str", expected, render(fragment_cache=fragment_cache), "warm fragment cache")
+        client.close()
+    print(f"render_compose: {services} fuzzed services identical across str, stream, file and fragment-cache paths")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check libyaml output against the pure-Python emitter.")
+    parser.add_argument("--cases", type=int, default=2000, help="Random documents for dump_compose (default: 2000)")
+    parser.add_argument("--services", type=int, default=200, help="Fuzzed containers for render_compose (default: 200)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    args = parser.parse_args()
+
+    print(f"libyaml C emitter available: {autocompose.CDumper is not None}")
+    rng = random.Random(args.seed)
+    check_dump(args.cases, rng)
+    check_render(args.services, rng)
+
+if __name__ == "__main__":
+    main()
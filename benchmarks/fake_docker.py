@@ -0,0 +1,187 @@
+# Minimal fake Docker Engine API for benchmarks: canned, deterministic responses with configurable latency.
+
+import re
+import json
+import time
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+API_VERSION = "1.43"
+
+# (counter name, method, path pattern) checked in order; the /vX.YY prefix is stripped first
+ROUTES = (
+    ('ping', 'GET', re.compile(r'^/_ping$')),
+    ('ping', 'HEAD', re.compile(r'^/_ping$')),
+    ('version', 'GET', re.compile(r'^/version$')),
+    ('events', 'GET', re.compile(r'^/events$')),
+    ('containers.list', 'GET', re.compile(r'^/containers/json$')),
+    ('containers.inspect', 'GET', re.compile(r'^/containers/(?P<key>[^/]+)/json$')),
+    ('images.list', 'GET', re.compile(r'^/images/json$')),
+    ('images.inspect', 'GET', re.compile(r'^/images/(?P<key>.+)/json$')),
+    ('networks.list', 'GET', re.compile(r'^/networks$')),
+    ('networks.inspect', 'GET', re.compile(r'^/networks/(?P<key>[^/]+)$')),
+)
+
+def container_inspect(i, image_count, network_names):
+    """Inspect JSON for the i-th fake container, shaped like what autocompose.py reads."""
+    container_id = f"{i + 1:064x}"
+    image_index = i % image_count
+    networks = {'bridge': {'Aliases': None, 'IPAddress': f"172.17.{i // 250}.{i % 250 + 2}"}}
+    if network_names:
+        networks[network_names[i % len(network_names)]] = {'Aliases': [f"svc{i}"], 'IPAddress': f"10.0.{i // 250}.{i % 250 + 2}"}
+    return {
+        'Id': container_id,
+        'Name': f"/bench-{i:04d}",
+        'Created': f"2024-01-{i % 28 + 1:02d}T{i % 24:02d}:{i % 60:02d}:00.000000000Z",
+        'Image': f"sha256:{image_index + 1:064x}",
+        'State': {'Status': 'running', 'Running': True},
+        'Config': {
+            'Image': f"bench/app{image_index}:latest",
+            'Cmd': ['serve', '--port', str(8000 + i)],
+            'Entrypoint': None,
+            'Env': [f"APP_ID={i}", 'LOG_LEVEL=info', 'PATH=/usr/local/bin:/usr/bin:/bin'],
+            'Labels': {'com.docker.compose.project': f"project{i % 5}", 'com.docker.compose.service': f"svc{i}"},
+            'User': '',
+            'WorkingDir': '/app',
+        },
+        'HostConfig': {
+            'RestartPolicy': {'Name': 'unless-stopped', 'MaximumRetryCount': 0},
+            'Privileged': False, 'PidMode': '', 'UTSMode': '', 'CapAdd': None, 'CapDrop': None, 'Devices': [],
+        },
+        'NetworkSettings': {
+            'Ports': {'8080/tcp': [{'HostIp': '0.0.0.0', 'HostPort': str(10000 + i)}], '9090/tcp': None},
+            'Networks': networks,
+        },
+        'Mounts': [ # The real daemon only sends 'Destination' (autocompose.py falls back to it); 'Target' is kept for older readers
+            {'Type': 'volume', 'Name': f"data{i}", 'Source': f"/var/lib/docker/volumes/data{i}/_data", 'Destination': '/data', 'Target': '/data', 'RW': True},
+            {'Type': 'bind', 'Source': f"/srv/bench/{i}", 'Destination': '/config', 'Target': '/config', 'RW': False},
+        ],
+    }
+
+class FakeDockerEngine:
+    """
+    Serves the Engine API endpoints the app uses (ping, version, container/image/network list
+    and inspect, an idle event stream) on 127.0.0.1. Every request sleeps latency_seconds first,
+    and is counted in .calls by endpoint so benchmarks can report API calls per operation.
+    """
+    def __init__(self, containers=10, images=None, networks=3, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.set_containers(containers, images, networks)
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real daemon
+            disable_nagle_algorithm = True # Headers and body go out separately; don't stall on delayed ACKs
+            def log_message(self, format, *args): pass
+            def do_GET(self): engine._handle(self)
+            def do_HEAD(self): engine._handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"tcp://127.0.0.1:{self._server.server_address[1]}"
+
+    def set_containers(self, containers, images=None, networks=3):
+        """Replaces the fake daemon's state with `containers` running containers."""
+        image_count = images or max(1, min(containers // 10, 50))
+        network_names = [f"benchnet{n}" for n in range(networks)]
+        with self._lock:
+            self._containers = {}
+            for i in range(containers):
+                data = container_inspect(i, image_count, network_names)
+                self._containers[data['Id']] = data
+            self._names = {data['Name'].lstrip('/'): cid for cid, data in self._containers.items()}
+            self._images = {}
+            for n in range(image_count):
+                image_id = f"sha256:{n + 1:064x}"
+                self._images[image_id] = {'Id': image_id, 'RepoTags': [f"bench/app{n}:latest"], 'RepoDigests': [], 'Created': 0, 'Size': 0, 'Labels': {}}
+            self._networks = {}
+            for name, driver in [('bridge', 'bridge')] + [(name, 'bridge') for name in network_names]:
+                self._networks[name] = {'Name': name, 'Id': f"{abs(hash(name)) % 16 ** 12:012x}{'0' * 52}", 'Driver': driver,
+                                        'Scope': 'local', 'Internal': False, 'Options': {}, 'Labels': {}, 'Containers': {}}
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = Counter()
+
+    def snapshot_calls(self):
+        with self._lock:
+            return Counter(self.calls)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-docker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handle(self, handler):
+        path, _, _ = handler.path.partition('?')
+        path = re.sub(r'^/v\d+\.\d+', '', path)
+        for name, method, pattern in ROUTES:
+            match = pattern.match(path)
+            if match and method == handler.command: break
+        else:
+            name, match = None, None
+        with self._lock:
+            self.calls[name or 'other'] += 1
+        if self.latency_seconds: time.sleep(self.latency_seconds)
+        if name == 'events':
+            return self._stream_events(handler)
+        status, body = self._respond(name, match.groupdict().get('key') if match else None)
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'text/plain' if name == 'ping' else 'application/json')
+        handler.send_header('Api-Version', API_VERSION)
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        if handler.command != 'HEAD': handler.wfile.write(payload)
+
+    def _respond(self, name, key):
+        with self._lock:
+            if name == 'ping': return 200, b"OK"
+            if name == 'version': return 200, {'ApiVersion': API_VERSION, 'Version': "24.0.0-fake", 'MinAPIVersion': "1.12", 'Os': "linux"}
+            if name == 'containers.list':
+                return 200, [{'Id': cid, 'Names': [data['Name']], 'Image': data['Config']['Image'], 'ImageID': data['Image'],
+                              'State': 'running', 'Labels': data['Config']['Labels']} for cid, data in self._containers.items()]
+            if name == 'containers.inspect':
+                cid = key if key in self._containers else self._names.get(key) or next((c for c in self._containers if c.startswith(key)), None)
+                if cid: return 200, self._containers[cid]
+                return 404, {'message': f"No such container: {key}"}
+            if name == 'images.list':
+                return 200, [{'Id': image_id, 'RepoTags': image['RepoTags']} for image_id, image in self._images.items()]
+            if name == 'images.inspect':
+                image = self._images.get(key) or next((i for i in self._images.values() if key in i['RepoTags']), None)
+                if image: return 200, image
+                return 404, {'message': f"No such image: {key}"}
+            if name == 'networks.list': return 200, list(self._networks.values())
+            if name == 'networks.inspect':
+                network = self._networks.get(key) or next((n for n in self._networks.values() if n['Id'].startswith(key)), None)
+                if network: return 200, network
+                return 404, {'message': f"network {key} not found"}
+        return 404, {'message': "page not found"}
+
+    def _stream_events(self, handler):
+        """An event stream that never sends anything, held open until the engine stops."""
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        handler.wfile.flush()
+        self._stopped.wait()
@@ -0,0 +1,68 @@
+# Filtering, sorting and cursor pagination of container rows for /api/containers.
+
+import json
+import base64
+import bisect
+
+# Sort value per field; 'created_ts' is computed once when the row is built
+SORT_FIELDS = {
+    'name': lambda row: row.get('name', '').lower(),
+    'image': lambda row: row.get('image', '').lower(),
+    'created': lambda row: row.get('created_ts', 0.0),
+}
+
+def encode_cursor(sort_value, row_id):
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id]).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """The (sort_value, row_id) a page ended at. Raises ValueError for a malformed cursor."""
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(row_id, str) or not isinstance(sort_value, (str, int, float)):
+        raise ValueError("Invalid cursor.")
+    return sort_value, row_id
+
+def row_matches(row, name=None, image=None, labels=(), network=None):
+    """
+    name/image match as case-insensitive substrings; each label is "key" (present) or
+    "key=value" (exact); network is an exact network name.
+    """
+    if name and name.lower() not in row.get('name', '').lower(): return False
+    if image and image.lower() not in row.get('image', '').lower(): return False
+    if network and network not in (row.get('networks') or ()): return False
+    row_labels = row.get('labels') or {}
+    for label in labels:
+        key, sep, value = label.partition('=')
+        if key not in row_labels or (sep and row_labels[key] != value): return False
+    return True
+
+def query_rows(rows, sort_by='name', descending=False, cursor=None, limit=100, **filters):
+    """
+    Returns (page, next_cursor, total) for rows matching filters, ordered by sort_by then ID.
+
+    The cursor is keyset-based (the last row's sort value and ID), so pages stay stable
+    when containers start or stop between requests.
+    """
+    sort_value = SORT_FIELDS.get(sort_by, SORT_FIELDS['name'])
+    keyed = sorted(((sort_value(row), row['id']), row) for row in rows if row_matches(row, **filters))
+    keys = [key for key, _ in keyed]
+    if descending:
+        keyed.reverse()
+        start = len(keys) - bisect.bisect_left(keys, tuple(cursor)) if cursor else 0
+    else:
+        start = bisect.bisect_right(keys, tuple(cursor)) if cursor else 0
+    page = [row for _, row in keyed[start:start + limit]]
+    next_cursor = encode_cursor(*keyed[start + limit - 1][0]) if start + limit < len(keyed) else None
+    return page, next_cursor, len(keyed)
+
+COMPOSE_PROJECT_LABEL = 'com.docker.compose.project'
+
+def project_index(rows):
+    """{compose project: [row, ...]} for rows labelled with a compose project, projects and rows sorted by name."""
+    projects = {}
+    for row in rows:
+        project = (row.get('labels') or {}).get(COMPOSE_PROJECT_LABEL)
+        if project: projects.setdefault(project, []).append(row)
+    return {project: sorted(members, key=SORT_FIELDS['name']) for project, members in sorted(projects.items())}
@@ -0,0 +1,123 @@
+# Long-lived Docker client management for app.py.
+
+import threading
+import time
+import logging
+import docker
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class DockerConnection:
+    """
+    One shared, thread-safe DockerClient per daemon and worker process.
+
+    The client keeps a pool of HTTP connections over the Docker socket, so requests reuse
+    open connections instead of connecting and pinging each time. A background thread pings
+    the daemon every health_interval seconds and reconnects when the ping fails; the request
+    path only connects when there is no healthy client yet.
+    """
+    def __init__(self, base_url=None, max_pool_size=10, health_interval=30, retry_interval=5, timeout=60):
+        self.base_url = base_url
+        self.max_pool_size = max_pool_size
+        self.health_interval = health_interval
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self._client = None
+        self._healthy = False
+        self._lock = threading.Lock()
+        self._last_attempt = 0.0
+        self._health_thread = None
+        self._stop = threading.Event()
+        self.connects = 0
+        self.reconnects = 0
+        self.health_failures = 0
+        self.last_error = None
+
+    def create_client(self):
+        """Returns a fresh client for the same daemon (e.g. for long-lived event streams)."""
+        if self.base_url:
+            client = docker.DockerClient(base_url=self.base_url, max_pool_size=self.max_pool_size, timeout=self.timeout)
+        else:
+            client = docker.from_env(max_pool_size=self.max_pool_size, timeout=self.timeout)
+        client.api.hooks['response'].append(metrics.count_docker_response) # APIClient is a requests.Session
+        return client
+
+    def _connect_locked(self):
+        self._last_attempt = time.monotonic()
+        old_client = self._client
+        try:
+            client = self.create_client()
+            client.ping()
+        except docker.errors.DockerException as e:
+            self._healthy = False
+            self.last_error = str(e)
+            logger.error(f"Could not connect to Docker daemon: {e}")
+            return None
+        if old_client is not None:
+            self.reconnects += 1
+            try: old_client.close()
+            except Exception: pass
+        self._client = client
+        self._healthy = True
+        self.connects += 1
+        self.last_error = None
+        logger.info("Successfully connected to Docker daemon.")
+        return client
+
+    def get_client(self):
+        """
+        Returns the shared client, or None if the daemon is unreachable.
+        Does not ping when a healthy client already exists.
+        """
+        client = self._client
+        if client is not None and self._healthy:
+            return client
+        with self._lock:
+            if self._client is not None and self._healthy:
+                return self._client
+            if time.monotonic() - self._last_attempt < self.retry_interval and self._last_attempt:
+                return None # Daemon was just unreachable; let the health thread retry
+            client = self._connect_locked()
+        self._ensure_health_thread()
+        return client
+
+    def mark_unhealthy(self, error=None):
+        """Called by request code that saw a connection-level failure; the next get_client() reconnects."""
+        with self._lock:
+            self._healthy = False
+            self._last_attempt = 0.0
+            if error is not None: self.last_error = str(error)
+
+    def _ensure_health_thread(self):
+        with self._lock:
+            if self._health_thread is None or not self._health_thread.is_alive():
+                self._health_thread = threading.Thread(target=self._health_loop, name="autocompose-docker-health", daemon=True)
+                self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval if self._healthy else self.retry_interval):
+            client = self._client
+            try:
+                if client is None: raise docker.errors.DockerException("not connected")
+                client.ping()
+                self._healthy = True
+            except Exception as e:
+                self.health_failures += 1
+                logger.warning(f"Docker health check failed, reconnecting: {e}")
+                with self._lock:
+                    self._healthy = False
+                    self._connect_locked()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'base_url': self.base_url or 'env',
+            'healthy': self._healthy,
+            'connects': self.connects,
+            'reconnects': self.reconnects,
+            'health_failures': self.health_failures,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,7 @@
+# Picked up automatically by gunicorn from the working directory (the Dockerfile's CMD runs from /app).
+
+def post_worker_init(worker):
+    # Start each worker's background threads (temp reaper, snapshot scheduler) as soon as it boots,
+    # rather than on its first request, so scheduled snapshots run on an idle instance too.
+    from app import startup
+    startup()
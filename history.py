@@ -0,0 +1,126 @@
+# Job history kept in a local SQLite database, so it survives restarts and stays out of the session cookie.
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+ENTRY_FIELDS = ('timestamp', 'operation', 'filename', 'message', 'category')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id TEXT NOT NULL,
+    created REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    operation TEXT NOT NULL DEFAULT '',
+    filename TEXT NOT NULL DEFAULT '',
+    message TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL DEFAULT 'info'
+);
+CREATE INDEX IF NOT EXISTS job_history_client ON job_history (client_id, id);
+CREATE INDEX IF NOT EXISTS job_history_created ON job_history (created);
+"""
+
+def _created(entry, now):
+    """Epoch seconds for an entry's display timestamp, falling back to now."""
+    try: return datetime.strptime(entry.get('timestamp') or '', TIMESTAMP_FORMAT).timestamp()
+    except ValueError: return now
+
+class HistoryStore:
+    """
+    Append-only job history per browser session (client_id), newest first.
+
+    Rows are only ever inserted, deleted by retention, or cleared by their owner, so every read
+    is an index range scan: page() costs the same whether a client has 50 entries or 50,000.
+    Retention keeps at most max_entries per client and drops anything older than max_age_seconds
+    (either may be None). Each thread gets its own connection; WAL lets readers run alongside a writer.
+    """
+    def __init__(self, path, max_entries=1000, max_age_seconds=None):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        """This thread's connection. Raises sqlite3.Error, or OSError if the database directory can't be created."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None: return conn
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None) # Autocommit; writes use explicit transactions
+        try:
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        except sqlite3.Error:
+            conn.close()
+            raise
+        self._local.conn = conn
+        return conn
+
+    def append(self, client_id, entries):
+        """
+        Records entries (newest first, as the UI lists them) and applies retention.
+        Errors are logged rather than raised: losing a history line must not fail the action it describes,
+        and page() and clear() degrade the same way when the database is unavailable.
+        """
+        if not entries: return
+        now = time.time()
+        rows = [(client_id, _created(entry, now)) + tuple(str(entry.get(field) or '') for field in ENTRY_FIELDS) for entry in reversed(entries)]
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("INSERT INTO job_history (client_id, created, timestamp, operation, filename, message, category) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._prune(conn, client_id, now)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Could not record job history in {self.path}: {e}")
+
+    def _prune(self, conn, client_id, now):
+        if self.max_entries is not None:
+            conn.execute("DELETE FROM job_history WHERE client_id = ? AND id <= "
+                         "(SELECT id FROM job_history WHERE client_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                         (client_id, client_id, self.max_entries))
+        if self.max_age_seconds is not None:
+            conn.execute("DELETE FROM job_history WHERE created < ?", (now - self.max_age_seconds,))
+
+    def page(self, client_id, limit=50, cursor=None, search=None):
+        """
+        Returns (entries, next_cursor): up to limit entries older than cursor (the next_cursor of
+        the previous page), newest first. search matches operation, filename and message (case-insensitive).
+        """
+        sql = "SELECT id, timestamp, operation, filename, message, category FROM job_history WHERE client_id = ?"
+        params = [client_id]
+        if cursor is not None:
+            sql += " AND id < ?"; params.append(cursor)
+        if search:
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            sql += " AND (operation LIKE ? ESCAPE '\\' OR filename LIKE ? ESCAPE '\\' OR message LIKE ? ESCAPE '\\')"
+            params += [pattern] * 3
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+        try:
+            rows = self._connect().execute(sql, params).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Could not read job history from {self.path}: {e}")
+            return [], None
+        entries = [dict(row) for row in rows[:limit]]
+        return entries, (entries[-1]['id'] if len(rows) > limit else None)
+
+    def clear(self, client_id):
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM job_history WHERE client_id = ?", (client_id,))
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Could not clear job history in {self.path}: {e}")
@@ -0,0 +1,187 @@
+# Several Docker daemons behind one UI: per-host connections, caches and inventories.
+
+import re
+import time
+import threading
+import logging
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import docker
+from inventory import ContainerSnapshot, ContainerInventory, MetadataEventWatcher
+from container_query import project_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST_NAME = "local"
+
+def parse_docker_hosts(spec):
+    """
+    Parses "name=url,name2=url2" (unix://, tcp://, ssh:// URLs) into [(name, url)].
+    A bare URL is named after its host part. An empty spec means the daemon from the
+    environment (DOCKER_HOST or the default socket), named "local".
+    """
+    hosts = []
+    for i, item in enumerate(part.strip() for part in (spec or "").split(",")):
+        if not item: continue
+        name, sep, url = item.partition("=")
+        if not sep or "://" in name:
+            url = item
+            parsed = urllib.parse.urlparse(url)
+            name = parsed.hostname or parsed.path.rsplit("/", 1)[-1] or f"host{i + 1}"
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", name.strip()) or f"host{i + 1}"
+        if any(existing == name for existing, _ in hosts):
+            raise ValueError(f"Duplicate Docker host name: {name!r}")
+        hosts.append((name, url.strip() or None))
+    return hosts or [(DEFAULT_HOST_NAME, None)]
+
+class DockerHost:
+    """
+    One Docker daemon: its pooled connection, metadata and fragment caches, and live inventory.
+    Without the live inventory, a MetadataEventWatcher still invalidates the metadata cache on
+    image and network events.
+
+    With namespaced=True, row IDs are "<host>/<container id>" and rows carry a 'host' key,
+    so containers from different daemons can share one grid and one selection.
+    """
+    def __init__(self, name, connection, row_builder, metadata_cache, fragment_cache, namespaced=False, live_inventory=True):
+        self.name = name
+        self.connection = connection
+        self.metadata_cache = metadata_cache
+        self.fragment_cache = fragment_cache
+        self.namespaced = namespaced
+        self.live_inventory = live_inventory
+        self._row_builder = row_builder
+        self.inventory = ContainerInventory(connection.create_client, self.get_client, self._build_row,
+                                            cache=metadata_cache, row_id=self.container_key)
+        self.metadata_watcher = None if live_inventory else MetadataEventWatcher(connection.create_client, metadata_cache)
+
+    def container_key(self, container_id):
+        return f"{self.name}/{container_id}" if self.namespaced else container_id
+
+    def _build_row(self, container, snapshot):
+        row = self._row_builder(container, snapshot)
+        if row is not None and self.namespaced:
+            row = dict(row, id=self.container_key(row['id']), host=self.name)
+        return row
+
+    def get_client(self):
+        client = self.connection.get_client()
+        if client is not None:
+            if self.live_inventory: self.inventory.start()
+            else: self.metadata_watcher.start()
+        return client
+
+    def require_client(self):
+        client = self.get_client()
+        if client is None:
+            raise ConnectionError(f"Could not connect to Docker host '{self.name}'.")
+        return client
+
+    def snapshot(self, client, ready_timeout):
+        """A ContainerSnapshot for generation, pre-filled from the inventory when it is ready."""
+        if self.live_inventory and self.inventory.wait_ready(timeout=ready_timeout):
+            return self.inventory.snapshot(client)
+        return ContainerSnapshot(client, cache=self.metadata_cache)
+
+    def list_rows(self, ready_timeout):
+        """(rows, snapshot) for this host's running containers."""
+        client = self.require_client()
+        if self.live_inventory and self.inventory.wait_ready(timeout=ready_timeout):
+            return list(self.inventory.rows()), self.inventory.snapshot(client)
+        try:
+            snapshot = ContainerSnapshot.from_running(client, cache=self.metadata_cache)
+        except OSError as e:
+            if not isinstance(e, docker.errors.APIError): self.connection.mark_unhealthy(e) # Connection-level failure
+            raise
+        rows = []
+        for container in snapshot.containers:
+            try:
+                row = self._build_row(container, snapshot)
+                if row: rows.append(row)
+            except Exception as e:
+                logger.error(f"Error processing container {getattr(container, 'id', 'UnknownID')} on '{self.name}': {e}")
+        return rows, snapshot
+
+    def list_projects(self, ready_timeout):
+        """({compose project: [row]}, snapshot) for this host; the live inventory keeps its index between calls."""
+        client = self.require_client()
+        if self.live_inventory and self.inventory.wait_ready(timeout=ready_timeout):
+            return self.inventory.projects(), self.inventory.snapshot(client)
+        rows, snapshot = self.list_rows(ready_timeout)
+        return project_index(rows), snapshot
+
+class HostRegistry:
+    """
+    The configured Docker hosts, in order; the first one is the default.
+
+    fan_out() queries hosts concurrently with a shared deadline, so one slow or dead
+    daemon costs at most the timeout instead of blocking the request. While a timed-out
+    call to a host is still running, later fan-outs report that host as unavailable right
+    away instead of queueing more work behind it.
+    """
+    def __init__(self, hosts, timeout=10):
+        self._hosts = OrderedDict((host.name, host) for host in hosts)
+        self.timeout = timeout
+        self._stuck = {} # host name -> future that missed its deadline
+        self._stuck_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 4 * len(self._hosts)), thread_name_prefix="autocompose-hosts")
+
+    def __iter__(self):
+        return iter(self._hosts.values())
+
+    def __len__(self):
+        return len(self._hosts)
+
+    @property
+    def default(self):
+        return next(iter(self._hosts.values()))
+
+    @property
+    def namespaced(self):
+        return len(self._hosts) > 1
+
+    def get(self, name):
+        return self._hosts.get(name)
+
+    def locate(self, key):
+        """(host, container_id) for a row/selection key; unqualified keys belong to the default host."""
+        name, sep, container_id = key.partition("/")
+        if not sep: return self.default, key
+        return self._hosts.get(name), container_id
+
+    def fan_out(self, fn, hosts=None, timeout=-1):
+        """
+        Runs fn(host) for each host concurrently. Returns {name: (result, error)} in host order.
+        Hosts that miss the deadline get a TimeoutError (their call keeps running in the
+        background). timeout=None waits for every host; the default is the registry timeout.
+        """
+        hosts = list(self if hosts is None else hosts)
+        timeout = self.timeout if timeout == -1 else timeout
+        if len(hosts) == 1 and timeout is None:
+            try: return {hosts[0].name: (fn(hosts[0]), None)}
+            except Exception as e: return {hosts[0].name: (None, e)}
+        futures = []
+        with self._stuck_lock:
+            for host in hosts:
+                stuck = self._stuck.get(host.name)
+                if stuck is not None and not stuck.done():
+                    futures.append((host.name, None))
+                    continue
+                self._stuck.pop(host.name, None)
+                futures.append((host.name, self._executor.submit(fn, host)))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = OrderedDict()
+        for name, future in futures:
+            if future is None:
+                results[name] = (None, TimeoutError(f"Docker host '{name}' is still not responding."))
+                continue
+            try:
+                results[name] = (future.result(timeout=None if deadline is None else max(0, deadline - time.monotonic())), None)
+            except FutureTimeoutError:
+                logger.warning(f"Docker host '{name}' did not answer within {timeout}s")
+                with self._stuck_lock: self._stuck[name] = future
+                results[name] = (None, TimeoutError(f"Docker host '{name}' did not answer within {timeout}s."))
+            except Exception as e:
+                results[name] = (None, e)
+        return results
@@ -0,0 +1,385 @@
+# Docker inventory helpers shared by app.py and autocompose.py.
+
+import threading
+import time
+import queue
+import logging
+from collections import OrderedDict
+import docker
+import metrics
+from container_query import project_index
+
+logger = logging.getLogger(__name__)
+
+_NOT_FOUND = object() # Cached negative lookups, so missing images/networks are not re-requested
+
+class MetadataCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL for image and network metadata.
+
+    Keys are (kind, name) tuples such as ('image', 'sha256:...') or ('network', 'bridge').
+    maxsize=None / ttl=None disable the size bound / expiry respectively.
+    """
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_kind(self, kind):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == kind]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+def apply_metadata_event(cache, event):
+    """
+    Invalidates cache entries touched by one Docker 'image' or 'network' event.
+    """
+    kind = event.get('Type')
+    actor = event.get('Actor') or {}
+    actor_id = actor.get('ID') or event.get('id') or ''
+    if kind == 'image':
+        if actor_id.startswith('sha256:'):
+            cache.invalidate(('image', actor_id))
+        # pull/tag/load events may only carry a reference, and can move tags between images
+        if not actor_id.startswith('sha256:') or event.get('Action') in ('tag', 'untag', 'pull', 'load', 'import'):
+            cache.invalidate_kind('image')
+    elif kind == 'network':
+        cache.invalidate(('network', actor_id))
+        name = (actor.get('Attributes') or {}).get('name')
+        if name: cache.invalidate(('network', name))
+
+class MetadataEventWatcher:
+    """
+    Keeps a MetadataCache current from Docker image and network events, for when the live
+    inventory (which does this itself) is turned off. If the stream drops, the cache is cleared,
+    since events may have been missed, and the subscription is retried.
+    """
+    def __init__(self, event_client_factory, cache, retry_delay=5):
+        self.event_client_factory = event_client_factory
+        self.cache = cache
+        self.retry_delay = retry_delay
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="autocompose-metadata-events", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                event_client = self.event_client_factory()
+                for event in event_client.events(decode=True, filters={'type': ['image', 'network']}):
+                    if self._stop.is_set(): return
+                    apply_metadata_event(self.cache, event)
+            except Exception as e:
+                logger.warning(f"Docker metadata event stream interrupted: {e}")
+            self.cache.clear()
+            self._stop.wait(self.retry_delay)
+
+class ContainerSnapshot:
+    """
+    A single request's view of the Docker daemon.
+
+    Containers are listed and inspected once; images and networks are each listed with one
+    summary call the first time they are needed (image tags come from the list summaries).
+    Everything looked up through the snapshot is memoized, so the UI grid and compose
+    generation share the same Docker round trips.
+    Image and network lookups go through a MetadataCache; pass a shared one to reuse
+    results across requests.
+    """
+    def __init__(self, client, containers=None, cache=None):
+        self.client = client
+        self.cache = cache if cache is not None else MetadataCache(maxsize=None, ttl=None)
+        self._lock = threading.Lock()
+        self._containers = {}
+        self._images = None
+        self._networks = None
+        for container in containers or []:
+            self._containers[container.id] = container
+
+    @classmethod
+    def from_running(cls, client, cache=None):
+        with metrics.phase('docker_list'):
+            containers = client.containers.list(all=False)
+        return cls(client, containers, cache=cache)
+
+    @property
+    def containers(self):
+        return list(self._containers.values())
+
+    def _find_container(self, name_or_id):
+        container = self._containers.get(name_or_id)
+        if container is not None: return container
+        for candidate in self._containers.values():
+            if candidate.id.startswith(name_or_id) or candidate.attrs.get('Name', '').lstrip('/') == name_or_id:
+                return candidate
+        return None
+
+    def get_container(self, name_or_id):
+        with self._lock:
+            container = self._find_container(name_or_id)
+        if container is None:
+            with metrics.phase('docker_inspect'):
+                container = self.client.containers.get(name_or_id) # Raises docker.errors.NotFound / APIError
+            with self._lock:
+                self._containers[container.id] = container
+        return container
+
+    def _cached(self, key, not_found_exc, loader):
+        value = self.cache.get(key)
+        if value is None:
+            try:
+                value = loader()
+            except docker.errors.NotFound: # ImageNotFound is a subclass
+                value = _NOT_FOUND
+            self.cache.put(key, value)
+        if value is _NOT_FOUND:
+            raise not_found_exc(f"{key[0].capitalize()} '{key[1]}' not found.")
+        return value
+
+    def _load_image(self, image_id):
+        with self._lock:
+            if self._images is None: # Raw summaries: images.list() would inspect every image on the daemon
+                self._images = {summary['Id']: self.client.images.prepare_model(summary) for summary in self.client.api.images()}
+            image = self._images.get(image_id)
+        return image if image is not None else self.client.images.get(image_id)
+
+    def _load_network(self, name):
+        with self._lock:
+            if self._networks is None:
+                self._networks = {}
+                for net in self.client.networks.list():
+                    self._networks[net.name] = net
+                    self._networks[net.id] = net
+            network = self._networks.get(name)
+        if network is None:
+            raise docker.errors.NotFound(f"Network '{name}' not found.")
+        return network
+
+    def get_image(self, image_id):
+        return self._cached(('image', image_id), docker.errors.ImageNotFound, lambda: self._load_image(image_id))
+
+    def get_network(self, name):
+        return self._cached(('network', name), docker.errors.NotFound, lambda: self._load_network(name))
+
+
+# Container actions that (re)read a container's inspect data, and ones that remove it
+_CONTAINER_REFRESH_ACTIONS = {'start', 'unpause', 'rename', 'update', 'restart'}
+_CONTAINER_REMOVE_ACTIONS = {'die', 'stop', 'destroy'}
+
+class ContainerInventory:
+    """
+    In-memory index of running containers kept current by the Docker events stream.
+
+    A background thread lists running containers once, then applies container
+    start/stop/die/rename/update events and network connect/disconnect events
+    incrementally. Image and network events also invalidate the metadata cache. Page
+    renders read rows(), projects() and snapshot() without touching the daemon; subscribers (the SSE
+    endpoint) receive deltas as they happen.
+
+    row_builder(container, snapshot) turns an inspected container into the dict shown in
+    the UI, or returns None to hide it. row_id(container_id) gives the ID that 'remove'
+    deltas carry, if rows use something other than the plain container ID.
+    """
+    def __init__(self, event_client_factory, client_getter, row_builder, cache=None, retry_delay=5, row_id=None):
+        self.event_client_factory = event_client_factory
+        self.client_getter = client_getter
+        self.row_builder = row_builder
+        self.row_id = row_id or (lambda container_id: container_id)
+        self.cache = cache
+        self.retry_delay = retry_delay
+        self.version = 0
+        self._containers = {}
+        self._rows = {}
+        self._rows_list = None
+        self._projects = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="autocompose-inventory", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def rows(self):
+        """All rows, as a list that is only rebuilt after the index changes."""
+        with self._lock:
+            if self._rows_list is None:
+                self._rows_list = list(self._rows.values())
+            return self._rows_list
+
+    def projects(self):
+        """Rows grouped by compose project (see container_query.project_index), only rebuilt after the index changes."""
+        with self._lock:
+            if self._projects is None:
+                self._projects = project_index(self._rows.values())
+            return self._projects
+
+    def get_row(self, container_id):
+        with self._lock:
+            return self._rows.get(container_id)
+
+    def snapshot(self, client):
+        """A ContainerSnapshot pre-filled with the already-inspected containers."""
+        with self._lock:
+            containers = list(self._containers.values())
+        return ContainerSnapshot(client, containers, cache=self.cache)
+
+    def subscribe(self, maxsize=1000, q=None):
+        """Returns a queue of deltas; pass q to share one queue between several inventories."""
+        q = q if q is not None else queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _publish_locked(self, delta):
+        self.version += 1
+        self._rows_list = None
+        self._projects = None
+        delta['version'] = self.version
+        for q in list(self._subscribers):
+            try: q.put_nowait(delta)
+            except queue.Full: # Slow consumer: drop it, the browser reconnects and resyncs
+                self._subscribers.discard(q)
+
+    def _upsert(self, container, snapshot):
+        try:
+            row = self.row_builder(container, snapshot)
+        except Exception as e:
+            logger.error(f"Error processing container {getattr(container, 'id', 'UnknownID')}: {e}")
+            row = None
+        with self._lock:
+            self._containers[container.id] = container
+            if row is None:
+                if self._rows.pop(container.id, None) is not None:
+                    self._publish_locked({'type': 'remove', 'id': self.row_id(container.id)})
+            elif self._rows.get(container.id) != row:
+                self._rows[container.id] = row
+                self._publish_locked({'type': 'upsert', 'container': row})
+
+    def _remove(self, container_id):
+        with self._lock:
+            self._containers.pop(container_id, None)
+            if self._rows.pop(container_id, None) is not None:
+                self._publish_locked({'type': 'remove', 'id': self.row_id(container_id)})
+
+    def _resync(self, client):
+        snapshot = ContainerSnapshot.from_running(client, cache=self.cache)
+        rows = {}
+        for container in snapshot.containers:
+            try:
+                row = self.row_builder(container, snapshot)
+                if row is not None: rows[container.id] = row
+            except Exception as e:
+                logger.error(f"Error processing container {getattr(container, 'id', 'UnknownID')}: {e}")
+        with self._lock:
+            self._containers = {c.id: c for c in snapshot.containers}
+            self._rows = rows
+            self._publish_locked({'type': 'reset'})
+        self._ready.set()
+
+    def _refresh(self, client, container_id):
+        try:
+            with metrics.phase('docker_inspect'):
+                container = client.containers.get(container_id)
+        except docker.errors.NotFound:
+            self._remove(container_id)
+            return
+        if (container.attrs.get('State') or {}).get('Running'):
+            self._upsert(container, ContainerSnapshot(client, [container], cache=self.cache))
+        else:
+            self._remove(container_id)
+
+    def apply_event(self, client, event):
+        kind = event.get('Type')
+        action = (event.get('Action') or '').split(':')[0] # e.g. "exec_start: sh" / "health_status: healthy"
+        actor = event.get('Actor') or {}
+        if kind == 'container':
+            container_id = actor.get('ID') or event.get('id')
+            if not container_id: return
+            if action in _CONTAINER_REFRESH_ACTIONS: self._refresh(client, container_id)
+            elif action in _CONTAINER_REMOVE_ACTIONS: self._remove(container_id)
+        elif kind in ('image', 'network'):
+            if self.cache is not None: apply_metadata_event(self.cache, event)
+            container_id = (actor.get('Attributes') or {}).get('container')
+            if kind == 'network' and action in ('connect', 'disconnect') and container_id:
+                with self._lock: known = container_id in self._containers
+                if known: self._refresh(client, container_id)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                event_client = self.event_client_factory()
+                client = self.client_getter() or event_client
+                since = int(time.time()) # Subscribe from before the listing so nothing is missed
+                self._resync(client)
+                for event in event_client.events(decode=True, since=since, filters={'type': ['container', 'image', 'network']}):
+                    if self._stop.is_set(): return
+                    try: self.apply_event(client, event)
+                    except Exception as e: logger.error(f"Error applying Docker event {event.get('Type')}/{event.get('Action')}: {e}")
+            except Exception as e:
+                logger.warning(f"Docker event stream interrupted, resyncing inventory: {e}")
+            if self.cache is not None: self.cache.clear() # Events may have been missed
+            self._stop.wait(self.retry_delay)
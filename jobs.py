@@ -0,0 +1,116 @@
+# Background job execution for long-running generate/save/upload work.
+
+import os
+import json
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class JobProgress:
+    """Handed to a job's work function so it can report per-file progress."""
+    def __init__(self, manager, job_id):
+        self._manager = manager
+        self.job_id = job_id
+
+    def set_total(self, total):
+        self._manager._update(self.job_id, total=total)
+
+    def file_done(self, name, message, category):
+        self._manager._file_done(self.job_id, {'name': name, 'message': message, 'category': category})
+
+class JobManager:
+    """
+    Runs jobs on a small thread pool and tracks their status.
+
+    Status is mirrored to <state_dir>/<job_id>.json, so any worker process can answer a
+    status poll for a job started by another one. A work function receives a JobProgress
+    and returns a JSON-serializable result dict, which may carry 'message' and 'category'
+    for the final status line.
+    """
+    def __init__(self, state_dir, max_workers=2, retention_seconds=86400):
+        self.state_dir = os.path.abspath(state_dir)
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="autocompose-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        if not (isinstance(job_id, str) and len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)):
+            raise ValueError(f"Invalid job ID: {job_id!r}")
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _persist_locked(self, job):
+        job['updated'] = time.time()
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            path = self._path(job['job_id'])
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(job, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.error(f"Could not persist status for job {job['job_id']}: {e}")
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            self._persist_locked(job)
+
+    def _file_done(self, job_id, file_entry):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['files'].append(file_entry)
+            job['completed'] = len(job['files'])
+            job['message'] = f"Processed {job['completed']} of {job['total'] or '?'}: {file_entry['name']}"
+            self._persist_locked(job)
+
+    def submit(self, action, work, total=0):
+        self.prune()
+        job_id = uuid.uuid4().hex
+        job = {'job_id': job_id, 'action': action, 'status': 'queued', 'message': "Queued.", 'category': 'info',
+               'total': total, 'completed': 0, 'files': [], 'result': None, 'created': time.time()}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._persist_locked(job)
+        self._executor.submit(self._run, job_id, work)
+        return job_id
+
+    def _run(self, job_id, work):
+        self._update(job_id, status='in_progress', message="Working...")
+        try:
+            result = work(JobProgress(self, job_id)) or {}
+            self._update(job_id, status='completed', result=result,
+                         message=result.get('message') or "Done.", category=result.get('category') or 'success')
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            self._update(job_id, status='failed', message=f"Job failed: {e}", category='danger')
+        finally:
+            with self._lock:
+                self._jobs.pop(job_id, None) # Finished jobs are served from disk
+
+    def get(self, job_id):
+        """The full job record, including 'result', or None if unknown."""
+        try: path = self._path(job_id)
+        except ValueError: return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None: return json.loads(json.dumps(job))
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def prune(self):
+        cutoff = time.time() - self.retention_seconds
+        try:
+            for entry in os.scandir(self.state_dir):
+                if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+                    try: os.remove(entry.path)
+                    except OSError: pass
+        except FileNotFoundError:
+            pass
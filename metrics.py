@@ -0,0 +1,180 @@
+# In-process metrics, rendered in the Prometheus text exposition format at /metrics.
+
+import re
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        self._function = None
+
+    def set_function(self, function):
+        """Reads the value at scrape time instead: function() returns a number, or {label value(s): number}."""
+        self._function = function
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        if self._function is not None:
+            try: value = self._function()
+            except Exception: return []
+            if not isinstance(value, dict): return [([], value)]
+            return [(list(zip(self.labelnames, key if isinstance(key, tuple) else (key,))), v) for key, v in sorted(value.items())]
+        with self._lock:
+            return [(list(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """A value that is set directly, or read from a callback at scrape time (set_function)."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, (counts, total) in self._samples():
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {counts[-1]}")
+        return lines
+
+    def _samples(self):
+        with self._lock:
+            return [(list(zip(self.labelnames, key)), (list(counts), total)) for key, (counts, total) in sorted(self._values.items())]
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+
+DOCKER_API_CALLS = REGISTRY.register(Counter(
+    "autocompose_docker_api_calls_total", "Docker Engine API requests by method, endpoint and status.", ("method", "endpoint", "status")))
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    "autocompose_phase_seconds", "Time spent per phase (docker_list, docker_inspect, image_lookup, render, yaml_dump, temp_save, github_api, zip_build).", ("phase",)))
+GENERATION_SECONDS = REGISTRY.register(Histogram(
+    "autocompose_generation_seconds", "Time to generate one compose file, from container lookup to YAML text."))
+TEMP_DIR_BYTES = REGISTRY.register(Gauge(
+    "autocompose_temp_dir_bytes", "Total size of generated batches in temporary storage."))
+SESSION_BYTES = REGISTRY.register(Gauge(
+    "autocompose_session_cookie_bytes", "Size of the most recent session cookie a browser sent."))
+# Read from each host's DockerConnection at scrape time (set_function in app.py)
+DOCKER_RECONNECTS = REGISTRY.register(Counter(
+    "autocompose_docker_reconnects_total", "Times the Docker client was replaced with a fresh connection, by host.", ("host",)))
+DOCKER_HEALTH_FAILURES = REGISTRY.register(Counter(
+    "autocompose_docker_health_failures_total", "Failed background pings of the Docker daemon, by host.", ("host",)))
+
+def phase(name):
+    """Context manager timing one phase into autocompose_phase_seconds."""
+    return PHASE_SECONDS.time(phase=name)
+
+def timed(name):
+    """Decorator form of phase()."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with phase(name): return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed_iter(name, iterable):
+    """Yields from iterable, timing the whole iteration (e.g. a streamed response) as one phase."""
+    with phase(name):
+        yield from iterable
+
+# Docker IDs and names are collapsed so the endpoint label stays low-cardinality
+_DOCKER_ENDPOINT_PATTERNS = (
+    (re.compile(r"^/v\d+\.\d+"), ""),
+    (re.compile(r"^/(containers|networks|volumes|exec)/(?!json$|create$|prune$)[^/]+(?=/|$)"), r"/\1/{id}"),
+    (re.compile(r"^/images/(?!json$|create$|prune$|search$|load$|get$)(.+?)(?=/json$|/history$|/push$|/tag$|/get$|$)"), "/images/{name}"),
+)
+
+def docker_endpoint(path):
+    for pattern, replacement in _DOCKER_ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path, count=1)
+    return path or "/"
+
+def count_docker_response(response, *args, **kwargs):
+    """requests response hook for a docker-py APIClient session."""
+    try:
+        path = response.request.path_url.partition("?")[0]
+        DOCKER_API_CALLS.inc(method=response.request.method, endpoint=docker_endpoint(path), status=response.status_code)
+    except Exception:
+        pass # Metrics must never break a Docker call
+    return response
@@ -0,0 +1,91 @@
+# Headless, interval-driven whole-host snapshots for app.py.
+
+import os
+import time
+import filecmp
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError: # Not POSIX; fall back to an in-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+def changed_files(file_infos, target_dir):
+    """The file infos whose content differs from (or is missing in) target_dir."""
+    changed = []
+    for file_info in file_infos:
+        previous_path = os.path.join(target_dir, file_info['filename'])
+        try:
+            if filecmp.cmp(file_info['temp_path'], previous_path, shallow=False): continue
+        except OSError:
+            pass # No previous version
+        changed.append(file_info)
+    return changed
+
+class SnapshotScheduler:
+    """
+    Calls run_snapshot() every interval_seconds on a daemon thread.
+
+    Every gunicorn worker runs its own scheduler, so a run holds an exclusive lock on
+    lock_path and records its start time there; a worker that finds a run younger than
+    half an interval skips its turn instead of repeating it.
+    """
+    def __init__(self, run_snapshot, interval_seconds, lock_path):
+        self.run_snapshot = run_snapshot
+        self.interval_seconds = interval_seconds
+        self.lock_path = lock_path
+        self.last_result = None
+        self.last_run = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="autocompose-snapshot", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            try: self.run_once()
+            except Exception as e: logger.exception(f"Scheduled snapshot failed: {e}")
+
+    def run_once(self, force=False):
+        """Runs a snapshot unless another process is running one or ran one recently. Returns its result, or None if skipped."""
+        if not self._lock.acquire(blocking=False): return None
+        try:
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            with open(self.lock_path, "a+", encoding="utf-8") as lock_file:
+                if fcntl is not None:
+                    try: fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError: return None # Another worker is running one
+                lock_file.seek(0)
+                try: previous_start = float(lock_file.read().strip() or 0)
+                except ValueError: previous_start = 0
+                if not force and time.time() - previous_start < self.interval_seconds / 2:
+                    return None
+                lock_file.seek(0); lock_file.truncate()
+                lock_file.write(str(time.time())); lock_file.flush()
+                started = time.monotonic()
+                result = self.run_snapshot()
+                logger.info(f"Snapshot finished in {time.monotonic() - started:.1f}s: {result.get('message')}")
+                self.last_result = result
+                self.last_run = time.time()
+                return result
+        finally:
+            self._lock.release()
+
+    def status(self):
+        return {
+            'interval_seconds': self.interval_seconds,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'last_run': self.last_run,
+            'last_result': self.last_result,
+        }
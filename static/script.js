@@ -51,6 +51,63 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // History is kept server-side; the modal shows the newest page and fetches older or matching entries from /api/history
+    const historyList = document.getElementById('job-history-list');
+    const historyEmpty = document.getElementById('job-history-empty');
+    const historyMoreBtn = document.getElementById('job-history-more-btn');
+    const historySearch = document.getElementById('job_history_search');
+    const historyState = { cursor: historyList ? historyList.dataset.nextCursor || null : null, query: '', generation: 0 };
+
+    function renderHistoryItem(entry) {
+        const item = document.createElement('li');
+        item.className = `job-history-item job-${entry.category}`;
+        const title = document.createElement('strong');
+        title.textContent = `${entry.timestamp} - ${entry.operation} for ${entry.filename || 'N/A'}`;
+        item.appendChild(title);
+        item.appendChild(document.createElement('br'));
+        item.appendChild(document.createTextNode(entry.message));
+        return item;
+    }
+
+    async function loadHistory(reset) {
+        if (!historyList) return;
+        const generation = reset ? ++historyState.generation : historyState.generation;
+        const params = new URLSearchParams({ limit: 50 });
+        if (historyState.query) params.set('q', historyState.query);
+        if (!reset && historyState.cursor) params.set('cursor', historyState.cursor);
+        try {
+            const response = await fetch(`/api/history?${params}`);
+            const data = await response.json();
+            if (generation !== historyState.generation) return; // Superseded by a newer search
+            if (!response.ok || !data.success) throw new Error(data.error || `Server responded with ${response.status}`);
+            if (reset) historyList.replaceChildren();
+            data.entries.forEach(entry => historyList.appendChild(renderHistoryItem(entry)));
+            historyState.cursor = data.next_cursor;
+            const hasEntries = historyList.children.length > 0;
+            historyList.style.display = hasEntries ? '' : 'none';
+            if (historyEmpty) {
+                historyEmpty.textContent = historyState.query ? 'No matching history entries.' : 'No job history yet for this session.';
+                historyEmpty.style.display = hasEntries ? 'none' : '';
+            }
+            if (historyMoreBtn) historyMoreBtn.style.display = data.next_cursor ? '' : 'none';
+        } catch (error) {
+            console.error('Error loading job history:', error);
+        }
+    }
+
+    if (historyMoreBtn) historyMoreBtn.addEventListener('click', () => loadHistory(false));
+
+    if (historySearch) {
+        let searchTimer = null;
+        historySearch.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => {
+                historyState.query = historySearch.value.trim();
+                loadHistory(true);
+            }, 250);
+        });
+    }
+
     window.addEventListener('click', (event) => {
         if (event.target === jobHistoryModal) {
             if (jobHistoryModal) jobHistoryModal.style.display = 'none';
@@ -66,50 +123,92 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     // --- AJAX for Container Selection & Dynamic Button Disabling ---
-    const containerCards = document.querySelectorAll('.container-card'); 
     const selectedCountDisplay = document.getElementById('selected-count-display'); 
     const generateStackBtn = document.getElementById('generate-stack-btn');
     const generateIndividualsBtn = document.getElementById('generate-individuals-btn');
 
-    async function toggleContainerSelection(containerId, containerName) {
-        try {
-            const response = await fetch('/api/toggle_selection', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ container_id: containerId, container_name: containerName })
-            });
+    // Clicks are applied to the card right away and sent to /api/selection in batches: they are
+    // debounced, coalesced per container, and only one selection request is in flight at a time.
+    const SELECTION_DEBOUNCE_MS = 150;
+    const pendingSelection = new Map(); // container key -> { name, selected }
+    let selectionTimer = null;
+    let selectionQueue = Promise.resolve();
 
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(errorData.error || `Server responded with ${response.status}`);
-            }
+    function setCardSelected(card, selected) {
+        card.classList.toggle('selected', selected);
+        const icon = card.querySelector('.icon');
+        if (icon) icon.textContent = selected ? '✅' : '🔲';
+    }
 
-            return await response.json();
-        } catch (error) {
-            console.error('Error toggling selection:', error);
-            throw error;
+    function updateSelectedCount(count) {
+        if (selectedCountDisplay) selectedCountDisplay.textContent = `Selected Containers: (${count})`;
+        updateGenerateButtonsState(count);
+    }
+
+    async function postSelection(payload) {
+        const response = await fetch('/api/selection', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(payload)
+        });
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || `Server responded with ${response.status}`);
         }
+        return data;
     }
 
-    function updateUIAfterToggle(data, cardElement) {
-        if (data.success) {
-            console.log(`Container ${data.id} selection toggled. New state: ${data.selected}. Count: ${data.selected_count}`);
-            if (selectedCountDisplay) {
-                selectedCountDisplay.textContent = `Selected Containers: (${data.selected_count})`;
-            }
-            updateGenerateButtonsState(data.selected_count);
+    // Queued behind any request already in flight, so changes reach the server in click order
+    function sendSelection(payload) {
+        const request = selectionQueue.then(() => postSelection(payload));
+        selectionQueue = request.catch(() => {});
+        return request.then(data => {
+            updateSelectedCount(data.selected_count);
+            if (!containerList) return data;
+            data.added.forEach(key => { if (!pendingSelection.has(key)) { const card = findCard(key); if (card) setCardSelected(card, true); } });
+            data.removed.forEach(key => { if (!pendingSelection.has(key)) { const card = findCard(key); if (card) setCardSelected(card, false); } });
+            return data;
+        });
+    }
 
-            cardElement.classList.toggle('selected', data.selected);
-            const icon = cardElement.querySelector('.icon');
-            if (icon) {
-                icon.textContent = data.selected ? '✅' : '🔲';
-            }
-        } else {
-            console.error('Error toggling selection:', data.error || 'Unknown server error');
-            alert('Error updating selection on server: ' + (data.error || 'Unknown error'));
+    function flushSelection() {
+        clearTimeout(selectionTimer);
+        selectionTimer = null;
+        if (!pendingSelection.size) return;
+        const batch = new Map(pendingSelection);
+        pendingSelection.clear();
+        const payload = { add: {}, remove: [] };
+        batch.forEach((change, key) => {
+            if (change.selected) payload.add[key] = change.name;
+            else payload.remove.push(key);
+        });
+        sendSelection(payload).catch(error => {
+            console.error('Error updating selection:', error);
+            batch.forEach((change, key) => { // Undo the cards that were not clicked again since
+                const card = pendingSelection.has(key) ? null : findCard(key);
+                if (card) setCardSelected(card, !change.selected);
+            });
+            displayFlashMessage('Error updating selection: ' + error.message, 'danger');
+        });
+    }
+
+    function handleCardClick(card) {
+        const containerId = card.dataset.containerId;
+        const containerName = card.dataset.containerName;
+
+        if (!containerId || !containerName) {
+            console.error('Card is missing data-container-id or data-container-name');
+            return;
         }
+
+        const selected = !card.classList.contains('selected');
+        setCardSelected(card, selected);
+        updateSelectedCount(Math.max(0, currentSelectedCount() + (selected ? 1 : -1))); // The server's count replaces it on reply
+        pendingSelection.set(containerId, { name: containerName, selected: selected });
+        clearTimeout(selectionTimer);
+        selectionTimer = setTimeout(flushSelection, SELECTION_DEBOUNCE_MS);
     }
 
     function updateGenerateButtonsState(count) {
@@ -130,57 +229,264 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    containerCards.forEach(card => {
-        card.addEventListener('click', async function() {
-            const containerId = this.dataset.containerId;
-            const containerName = this.dataset.containerName;
-            
-            if (!containerId || !containerName) {
-                console.error('Card is missing data-container-id or data-container-name');
-                return;
-            }
+    // Delegated, so cards added later by the live inventory stream are clickable too
+    const containerList = document.querySelector('.container-list');
+    if (containerList) {
+        containerList.addEventListener('click', (event) => {
+            const card = event.target.closest('.container-card');
+            if (card) handleCardClick(card);
+        });
+    }
 
-            try {
-                this.classList.add('loading'); // Add loading state
-                const result = await toggleContainerSelection(containerId, containerName);
-                updateUIAfterToggle(result, this);
-            } catch (error) {
-                alert('Error updating selection: ' + error.message);
-                // Revert the visual change if there was an error
-                this.classList.toggle('selected');
-                const icon = this.querySelector('.icon');
-                if (icon) {
-                    icon.textContent = this.classList.contains('selected') ? '✅' : '🔲';
-                }
-            } finally {
-                this.classList.remove('loading'); // Remove loading state
-            }
+    // Select All / Deselect All: one /api/selection request, honouring the name filter; the form post stays as a no-JS fallback
+    document.querySelectorAll('button[name="select_action"]').forEach(button => {
+        button.addEventListener('click', (event) => {
+            event.preventDefault();
+            flushSelection();
+            const filterText = containerFilter ? containerFilter.value.trim() : '';
+            const payload = button.value === 'select_all' ? { select_matching: filterText ? { name: filterText } : {} } : { clear: true };
+            sendSelection(payload).catch(error => displayFlashMessage('Error updating selection: ' + error.message, 'danger'));
         });
     });
 
     // Initial state check for generate buttons
     if (selectedCountDisplay) {
-        const match = selectedCountDisplay.textContent.match(/\((\d+)\)/);
-        const initialCount = match ? parseInt(match[1], 10) : 0;
-        updateGenerateButtonsState(initialCount);
+        updateGenerateButtonsState(currentSelectedCount());
     }
 
-    // --- Job Initiation and Status Polling ---
-    async function initiateJob(action, files) {
+    // --- Live Container Inventory (Server-Sent Events) ---
+    function buildInfoRow(leftLabel, leftValue, rightLabel, rightValue) {
+        const row = document.createElement('div');
+        row.className = 'info-row';
+        [['info-left', leftLabel, leftValue], ['info-right', rightLabel, rightValue]].forEach(([cls, label, value]) => {
+            const span = document.createElement('span');
+            span.className = cls;
+            const labelSpan = document.createElement('span');
+            labelSpan.className = 'info-label';
+            labelSpan.textContent = label;
+            span.appendChild(labelSpan);
+            span.appendChild(document.createTextNode(' ' + value));
+            row.appendChild(span);
+        });
+        return row;
+    }
+
+    function renderContainerCard(container, selected) {
+        const card = document.createElement('div');
+        card.className = 'container-card' + (selected ? ' selected' : '');
+        card.dataset.containerId = container.id;
+        card.dataset.containerName = container.name;
+        card.dataset.image = container.image;
+        card.dataset.created = container.created;
+        card.title = `Click to select/deselect ${container.name}`;
+        card.setAttribute('role', 'button');
+        card.tabIndex = 0;
+
+        const header = document.createElement('div');
+        header.className = 'container-card-header';
+        const icon = document.createElement('span');
+        icon.className = 'icon';
+        icon.textContent = selected ? '✅' : '🔲';
+        const name = document.createElement('strong');
+        name.textContent = container.name;
+        header.appendChild(icon);
+        header.appendChild(name);
+        if (container.host) {
+            const host = document.createElement('span');
+            host.className = 'container-host';
+            host.textContent = container.host;
+            header.appendChild(host);
+        }
+
+        const grid = document.createElement('div');
+        grid.className = 'container-card-info-grid';
+        grid.appendChild(buildInfoRow('Image:', container.image, 'ID:', container.short_id));
+        grid.appendChild(buildInfoRow('Ports:', container.ports, 'Created:', container.created));
+
+        card.appendChild(header);
+        card.appendChild(grid);
+        return card;
+    }
+
+    function cardSortKey(card, sortBy) {
+        if (sortBy === 'image') return (card.dataset.image || '').toLowerCase();
+        if (sortBy === 'created') return card.dataset.created || '';
+        return (card.dataset.containerName || '').toLowerCase();
+    }
+
+    function currentSort() {
+        const sortSelect = document.getElementById('sort_by_select');
+        const descRadio = document.getElementById('sort_order_desc');
+        return { sortBy: sortSelect ? sortSelect.value : 'name', desc: descRadio ? descRadio.checked : false };
+    }
+
+    function insertCardSorted(card) {
+        const filterText = gridState.filter.toLowerCase();
+        if (filterText && !(card.dataset.containerName || '').toLowerCase().includes(filterText)) return;
+        const { sortBy, desc } = currentSort();
+        const key = cardSortKey(card, sortBy);
+        const next = Array.from(containerList.querySelectorAll('.container-card')).find(other => {
+            const otherKey = cardSortKey(other, sortBy);
+            return desc ? otherKey < key : otherKey > key;
+        });
+        if (!next && !gridState.done) return; // Sorts after the loaded pages; a later page will bring it
+        containerList.insertBefore(card, next || null);
+        const emptyMessage = document.getElementById('container-list-empty');
+        if (emptyMessage) emptyMessage.style.display = 'none';
+    }
+
+    function findCard(containerId) {
+        return containerList.querySelector(`.container-card[data-container-id="${CSS.escape(containerId)}"]`);
+    }
+
+    function applyInventoryUpsert(container) {
+        const existing = findCard(container.id);
+        const selected = existing ? existing.classList.contains('selected') : false;
+        const card = renderContainerCard(container, selected);
+        if (existing) existing.replaceWith(card);
+        else insertCardSorted(card);
+    }
+
+    function applyInventoryRemove(containerId) {
+        const existing = findCard(containerId);
+        if (existing) existing.remove();
+    }
+
+    function resyncInventory() {
+        reloadGrid();
+    }
+
+    // --- Paged Container Grid ---
+    // Cards are fetched from /api/containers a page at a time as the sentinel scrolls into view,
+    // so the page stays light with hundreds of containers.
+    const CONTAINER_PAGE_SIZE = 100;
+    const gridSentinel = document.getElementById('container-list-sentinel');
+    const containerFilter = document.getElementById('container_filter');
+    // An empty grid is rendered without a sentinel and never fetches a page, so it starts out complete:
+    // live upserts then land in it instead of waiting for a page that will never load
+    const gridState = { cursor: null, done: !gridSentinel || !containerList || containerList.dataset.total === '0', loading: false, generation: 0, filter: '' };
+
+    function updateSentinel(text) {
+        if (!gridSentinel) return;
+        gridSentinel.textContent = text;
+        gridSentinel.style.display = text ? 'block' : 'none';
+    }
+
+    async function loadNextPage() {
+        if (!containerList || gridState.loading || gridState.done) return;
+        const generation = gridState.generation;
+        const { sortBy, desc } = currentSort();
+        const params = new URLSearchParams({ sort_by: sortBy, sort_order: desc ? 'desc' : 'asc', limit: CONTAINER_PAGE_SIZE });
+        if (gridState.filter) params.set('name', gridState.filter);
+        if (gridState.cursor) params.set('cursor', gridState.cursor);
+        gridState.loading = true;
         try {
-            const response = await fetch(`/${action}`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ files: files })
-            });
+            const response = await fetch(`/api/containers?${params}`);
             const data = await response.json();
-            return data.job_id;
+            if (generation !== gridState.generation) return; // Superseded by a reload
+            if (!response.ok || !data.success) throw new Error(data.error || `Server responded with ${response.status}`);
+            const fragment = document.createDocumentFragment();
+            data.containers.forEach(container => {
+                if (!findCard(container.id)) fragment.appendChild(renderContainerCard(container, container.selected));
+            });
+            containerList.appendChild(fragment);
+            gridState.cursor = data.next_cursor;
+            gridState.done = !data.next_cursor;
+            if (gridState.done) updateSentinel(data.total ? '' : 'No matching containers.');
+            else updateSentinel(`Showing ${containerList.children.length} of ${data.total} containers...`);
         } catch (error) {
-            console.error(`Error initiating ${action}:`, error);
-            throw error;
+            console.error('Error loading containers:', error);
+            if (generation === gridState.generation) updateSentinel('Error loading containers: ' + error.message);
+        } finally {
+            if (generation === gridState.generation) gridState.loading = false;
+        }
+        if (generation === gridState.generation && !gridState.done && sentinelVisible()) loadNextPage();
+    }
+
+    function sentinelVisible() {
+        if (!gridSentinel) return true;
+        const rect = gridSentinel.getBoundingClientRect();
+        return rect.top < window.innerHeight + 200;
+    }
+
+    function reloadGrid() {
+        if (!containerList) return;
+        gridState.generation++;
+        gridState.cursor = null;
+        gridState.done = false;
+        gridState.loading = false;
+        containerList.replaceChildren();
+        updateSentinel('Loading containers...');
+        loadNextPage();
+    }
+
+    if (containerList && gridSentinel) {
+        if (window.IntersectionObserver) {
+            new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) loadNextPage();
+            }, { rootMargin: '200px' }).observe(gridSentinel);
+        }
+        loadNextPage();
+    }
+
+    if (containerFilter) {
+        let filterTimer = null;
+        containerFilter.addEventListener('keydown', (event) => {
+            if (event.key === 'Enter') event.preventDefault(); // Would submit the controls form (Select All)
+        });
+        containerFilter.addEventListener('input', () => {
+            clearTimeout(filterTimer);
+            filterTimer = setTimeout(() => {
+                gridState.filter = containerFilter.value.trim();
+                reloadGrid();
+            }, 250);
+        });
+    }
+
+    // The server caps open streams per worker; a refused (503) stream closes for good, so the grid
+    // is refreshed on a timer instead and the stream is retried after each refresh.
+    const INVENTORY_POLL_MS = 30000;
+    let inventoryStreamOpened = false;
+
+    function openInventoryStream() {
+        const inventoryStream = new EventSource('/api/inventory/stream');
+        inventoryStream.addEventListener('upsert', (event) => applyInventoryUpsert(JSON.parse(event.data).container));
+        inventoryStream.addEventListener('remove', (event) => applyInventoryRemove(JSON.parse(event.data).id));
+        inventoryStream.addEventListener('reset', () => resyncInventory());
+        inventoryStream.onopen = () => {
+            if (inventoryStreamOpened) resyncInventory(); // Catch up on anything missed while reconnecting
+            inventoryStreamOpened = true;
+        };
+        inventoryStream.onerror = () => {
+            if (inventoryStream.readyState !== EventSource.CLOSED) return; // The browser is reconnecting by itself
+            setTimeout(() => {
+                resyncInventory();
+                openInventoryStream();
+            }, INVENTORY_POLL_MS);
+        };
+    }
+
+    if (containerList && window.EventSource) openInventoryStream();
+
+    // --- Job Initiation and Status Polling ---
+    const jobStatusElement = document.getElementById('job-status');
+
+    async function initiateJob(action) {
+        const payload = { action: action };
+        const projectSelect = document.getElementById('compose_project_select');
+        if (action === 'generate_projects' && projectSelect) payload.project = projectSelect.value; // Empty means every project
+        const response = await fetch('/api/jobs', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(payload)
+        });
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || `Server responded with ${response.status}`);
         }
+        return data.job_id;
     }
 
     async function checkJobStatus(jobId) {
@@ -196,49 +502,46 @@ document.addEventListener('DOMContentLoaded', () => {
     async function pollJobStatus(jobId, updateUI) {
         const status = await checkJobStatus(jobId);
         updateUI(status);
-        if (status.status === 'in_progress') {
+        if (status.status === 'queued' || status.status === 'in_progress') {
             setTimeout(() => pollJobStatus(jobId, updateUI), 1000);  // Poll every second
-        } else if (status.status === 'completed' && status.message) {
-            displayFlashMessage(status.message, status.category);
+        } else if (status.status === 'completed' || status.status === 'failed') {
+            window.location.reload(); // Results and flash messages were stored in the session by the last poll
+        } else if (status.message) {
+            displayFlashMessage(status.message, status.category || 'danger');
         }
     }
 
-    document.getElementById('save-to-local-btn').addEventListener('click', async () => {
-        try {
-            const jobId = await initiateJob('save_to_local', getCurrentFiles());
-            pollJobStatus(jobId, updateSaveToLocalUI);
-        } catch (error) {
-            alert('Error initiating save to local: ' + error.message);
-        }
-    });
+    function updateJobStatusUI(status) {
+        if (!jobStatusElement) return;
+        jobStatusElement.style.display = 'block';
+        const progress = status.total ? ` (${status.completed}/${status.total})` : '';
+        jobStatusElement.textContent = `${status.message || status.status}${progress}`;
+        jobStatusElement.classList.toggle('success', status.status === 'completed');
+        jobStatusElement.classList.toggle('error', status.status === 'failed');
+    }
 
-    document.getElementById('upload-to-github-btn').addEventListener('click', async () => {
-        try {
-            const jobId = await initiateJob('upload_to_github', getCurrentFiles());
-            pollJobStatus(jobId, updateUploadToGithubUI);
-        } catch (error) {
-            alert('Error initiating GitHub upload: ' + error.message);
-        }
+    // Generate / save / upload run as background jobs; the form submit stays as a no-JS fallback
+    document.querySelectorAll('[data-job-action]').forEach(button => {
+        button.addEventListener('click', async (event) => {
+            event.preventDefault();
+            const jobButtons = document.querySelectorAll('[data-job-action]');
+            jobButtons.forEach(b => b.disabled = true);
+            try {
+                const jobId = await initiateJob(button.dataset.jobAction);
+                updateJobStatusUI({ status: 'queued', message: 'Queued.' });
+                pollJobStatus(jobId, updateJobStatusUI);
+            } catch (error) {
+                jobButtons.forEach(b => b.disabled = false);
+                updateGenerateButtonsState(currentSelectedCount());
+                displayFlashMessage('Error starting job: ' + error.message, 'danger');
+            }
+        });
     });
 
-    function updateSaveToLocalUI(status) {
-        const statusElement = document.getElementById('save-to-local-status');
-        statusElement.textContent = status.message;
-        if (status.status === 'completed') {
-            statusElement.classList.add('success');
-        } else if (status.status === 'failed') {
-            statusElement.classList.add('error');
-        }
-    }
-
-    function updateUploadToGithubUI(status) {
-        const statusElement = document.getElementById('upload-to-github-status');
-        statusElement.textContent = status.message;
-        if (status.status === 'completed') {
-            statusElement.classList.add('success');
-        } else if (status.status === 'failed') {
-            statusElement.classList.add('error');
-        }
+    function currentSelectedCount() {
+        if (!selectedCountDisplay) return 0;
+        const match = selectedCountDisplay.textContent.match(/\((\d+)\)/);
+        return match ? parseInt(match[1], 10) : 0;
     }
 
     function displayFlashMessage(message, category) {
@@ -260,11 +563,6 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    function getCurrentFiles() {
-        // Implement this function to return the current list of files to be saved/uploaded
-        // This might involve getting the data from your current UI state
-    }
-
     // Add this function to handle the column slider change
     function updateGridColumns(value) {
         document.documentElement.style.setProperty('--grid-columns', value);
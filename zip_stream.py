@@ -0,0 +1,49 @@
+# Streaming ZIP writer: yields the archive in chunks instead of building it in memory.
+
+import os
+import zipfile
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that buffers what zipfile writes until drained."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self._chunks:
+            data = b"".join(self._chunks)
+            self._chunks = []
+            yield data
+
+def stream_zip(entries, compression=zipfile.ZIP_DEFLATED, chunk_size=64 * 1024):
+    """
+    Yields a ZIP archive of entries, an iterable of (path_on_disk, arcname) pairs.
+    Files are read chunk by chunk, so memory stays flat no matter how large the archive is.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression) as zf:
+        for path, arcname in entries:
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = compression
+            with open(path, 'rb') as src, zf.open(zinfo, 'w') as dest:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk: break
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain() # Central directory
+
+def directory_entries(root_dir, arc_prefix=""):
+    """(path, arcname) pairs for every file under root_dir, in a stable order. Hidden directories (in-progress saves) are skipped."""
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            yield path, os.path.join(arc_prefix, os.path.relpath(path, root_dir)).replace("\\", "/")